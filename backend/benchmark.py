@@ -0,0 +1,567 @@
+"""Load and benchmark harness for the PMS API.
+
+Seeds a dedicated MongoDB database with configurable volumes, drives every
+route on ``api_router`` concurrently and writes per-endpoint throughput and
+latency percentiles as JSON. Two result files can be compared to flag
+regressions.
+
+    # seed, start a local server against the bench DB and run
+    python benchmark.py --spawn-server --out results.json
+
+    # compare against an earlier run; exits 1 on regression
+    python benchmark.py --spawn-server --out new.json --compare results.json
+
+    # interactive latency while batch jobs run in the background
+    python benchmark.py --spawn-server --background-jobs 20 --out batch.json --compare results.json
+
+    # login throughput with bcrypt at the production cost factor
+    python benchmark.py --spawn-server --workers 4 --bcrypt-rounds 12 --only login get_me
+
+    # burst traffic against a small pool; pool gauges are on /api/metrics
+    python benchmark.py --spawn-server --max-pool-size 10 --concurrency 64
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import requests
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# The server module reads DB_NAME at import time; point it at the bench DB first
+BENCH_DB_NAME = os.environ.get('BENCH_DB_NAME', f"{os.environ.get('DB_NAME', 'pms')}_bench")
+os.environ['DB_NAME'] = BENCH_DB_NAME
+
+import server  # noqa: E402
+
+DEFAULT_VOLUMES = {
+    "suppliers": 200,
+    "items": 5000,
+    "purchase_requisitions": 2000,
+    "purchase_orders": 5000,
+    "goods_receipts": 3000,
+    "invoices": 3000,
+}
+BENCH_USERS = 10
+BENCH_PASSWORD = "bench-password"
+CATEGORIES = ["Raw Materials", "Electronics", "Packaging", "Office", "Maintenance", "Safety"]
+DEPARTMENTS = ["Operations", "Engineering", "Finance", "Warehouse"]
+
+
+# Seeding
+def line_items(rng, items, count):
+    lines = []
+    for item in rng.sample(items, min(count, len(items))):
+        quantity = rng.randint(1, 50)
+        lines.append(server.LineItem(
+            item_id=item['id'],
+            item_name=item['name'],
+            quantity=quantity,
+            unit_price=item['unit_price'],
+            total=round(quantity * item['unit_price'], 2),
+        ))
+    return lines
+
+
+def insert_chunked(collection, docs, chunk=1000):
+    for start in range(0, len(docs), chunk):
+        collection.insert_many(docs[start:start + chunk], ordered=False)
+
+
+def seed(database, volumes, rng):
+    for name in DEFAULT_VOLUMES:
+        database[name].drop()
+    database.counters.drop()
+    database.users.drop()
+    now = datetime.now(timezone.utc)
+
+    def created(i, total):
+        return now - timedelta(days=365) + timedelta(days=365 * i / max(total, 1))
+
+    suppliers = []
+    for i in range(volumes['suppliers']):
+        suppliers.append(server.Supplier(
+            name=f"Supplier {i:05d}",
+            email=f"supplier{i}@example.com",
+            city="Berlin",
+            country="DE",
+            tax_id=f"TAX-{i:06d}",
+            created_at=created(i, volumes['suppliers']),
+        ).model_dump())
+    insert_chunked(database.suppliers, suppliers)
+
+    items = []
+    for i in range(volumes['items']):
+        quantity = rng.randint(0, 200)
+        reorder_level = rng.randint(5, 50)
+        items.append(server.Item(
+            name=f"Item {i:06d}",
+            sku=f"SKU-{i:06d}",
+            category=rng.choice(CATEGORIES),
+            unit_price=round(rng.uniform(1, 500), 2),
+            quantity=quantity,
+            reorder_level=reorder_level,
+            supplier_id=rng.choice(suppliers)['id'],
+            created_at=created(i, volumes['items']),
+            **server.stock_status(quantity, reorder_level),
+        ).model_dump())
+    insert_chunked(database.items, items)
+
+    prs = []
+    for i in range(volumes['purchase_requisitions']):
+        lines = line_items(rng, items, rng.randint(1, 5))
+        prs.append(server.PurchaseRequisition(
+            pr_number=f"PR-{i + 1:05d}",
+            requester_id=str(uuid.uuid4()),
+            requester_name="Bench Requester",
+            department=rng.choice(DEPARTMENTS),
+            items=lines,
+            total_amount=sum(line.total for line in lines),
+            status=rng.choice(list(server.PRStatus)),
+            created_at=created(i, volumes['purchase_requisitions']),
+        ).model_dump())
+    insert_chunked(database.purchase_requisitions, prs)
+
+    pos = []
+    for i in range(volumes['purchase_orders']):
+        supplier = rng.choice(suppliers)
+        lines = line_items(rng, items, rng.randint(1, 8))
+        created_at = created(i, volumes['purchase_orders'])
+        pos.append(server.PurchaseOrder(
+            po_number=f"PO-{i + 1:05d}",
+            supplier_id=supplier['id'],
+            supplier_name=supplier['name'],
+            items=lines,
+            total_amount=sum(line.total for line in lines),
+            status=rng.choice([server.ApprovalStatus.PENDING, server.ApprovalStatus.APPROVED]),
+            delivery_date=created_at + timedelta(days=rng.randint(3, 30)),
+            created_by="bench",
+            created_at=created_at,
+            updated_at=created_at,
+        ).model_dump())
+    insert_chunked(database.purchase_orders, pos)
+
+    grs = []
+    for i in range(volumes['goods_receipts']):
+        po = rng.choice(pos)
+        grs.append(server.GoodsReceipt(
+            gr_number=f"GR-{i + 1:05d}",
+            po_id=po['id'],
+            po_number=po['po_number'],
+            items=po['items'],
+            received_by="bench",
+            created_at=created(i, volumes['goods_receipts']),
+        ).model_dump())
+    insert_chunked(database.goods_receipts, grs)
+
+    invoices = []
+    for i in range(volumes['invoices']):
+        po = rng.choice(pos)
+        invoices.append(server.Invoice(
+            invoice_number=f"INV-{i + 1:05d}",
+            po_id=po['id'],
+            supplier_id=po['supplier_id'],
+            supplier_name=po['supplier_name'],
+            items=po['items'],
+            total_amount=po['total_amount'],
+            created_at=created(i, volumes['invoices']),
+        ).model_dump())
+    insert_chunked(database.invoices, invoices)
+
+    return {"suppliers": suppliers, "items": items, "prs": prs, "pos": pos}
+
+
+# Load generation
+class Scenario:
+    def __init__(self, name, method, template, build, weight=1.0):
+        self.name = name
+        self.method = method
+        self.template = template
+        self.build = build
+        self.weight = weight
+
+
+def build_scenarios(data, rng, page_size):
+    suppliers, items, prs, pos = data['suppliers'], data['items'], data['prs'], data['pos']
+    users = data['users']
+
+    def line_payload(count):
+        return [line.model_dump() for line in line_items(rng, items, count)]
+
+    def unique():
+        return uuid.uuid4().hex[:12]
+
+    def po_body():
+        supplier = rng.choice(suppliers)
+        return {"supplier_id": supplier['id'], "supplier_name": supplier['name'],
+                "items": line_payload(3), "created_by": "bench"}
+
+    def gr_body():
+        po = rng.choice(pos)
+        return {"po_id": po['id'], "items": line_payload(5), "received_by": "bench"}
+
+    def csv_upload(rows):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["name", "sku", "category", "unit_price", "quantity", "reorder_level"])
+        for _ in range(rows):
+            writer.writerow([f"Imported {unique()}", f"IMP-{unique()}", rng.choice(CATEGORIES),
+                             round(rng.uniform(1, 100), 2), rng.randint(0, 100), 10])
+        return {"files": {"file": ("items.csv", out.getvalue(), "text/csv")}}
+
+    def ndjson_upload(rows):
+        lines = [json.dumps({"name": f"Imported {unique()}", "tax_id": f"IMP-{unique()}"}) for _ in range(rows)]
+        return {"files": {"file": ("suppliers.ndjson", "\n".join(lines), "application/x-ndjson")}}
+
+    def register_body():
+        return {"json": {"email": f"bench-{unique()}@example.com", "name": "Bench", "role": "purchaser",
+                         "password": BENCH_PASSWORD}}
+
+    def supplier_body():
+        return {"name": f"Supplier {unique()}", "tax_id": f"TAX-{unique()}"}
+
+    def item_body():
+        return {"name": f"Item {unique()}", "sku": f"SKU-{unique()}", "category": rng.choice(CATEGORIES),
+                "unit_price": 9.5, "quantity": 20, "reorder_level": 10}
+
+    page = {"params": {"limit": page_size}}
+    return [
+        Scenario("register", "POST", "/api/auth/register", register_body, 0.2),
+        Scenario("login", "POST", "/api/auth/login",
+                 lambda: {"json": {"email": rng.choice(users), "password": BENCH_PASSWORD}}),
+        Scenario("get_me", "GET", "/api/auth/me", lambda: {}),
+        Scenario("get_suppliers", "GET", "/api/suppliers", lambda: page),
+        Scenario("get_supplier", "GET", "/api/suppliers/{supplier_id}",
+                 lambda: {"path": {"supplier_id": rng.choice(suppliers)['id']}}),
+        Scenario("create_supplier", "POST", "/api/suppliers", lambda: {"json": supplier_body()}),
+        Scenario("update_supplier", "PUT", "/api/suppliers/{supplier_id}",
+                 lambda: {"path": {"supplier_id": rng.choice(suppliers)['id']}, "json": supplier_body()}),
+        Scenario("import_suppliers", "POST", "/api/suppliers/import", lambda: ndjson_upload(200), 0.05),
+        Scenario("get_items", "GET", "/api/items", lambda: page),
+        Scenario("get_low_stock_items", "GET", "/api/items/low-stock", lambda: page),
+        Scenario("get_item", "GET", "/api/items/{item_id}",
+                 lambda: {"path": {"item_id": rng.choice(items)['id']}}),
+        Scenario("create_item", "POST", "/api/items", lambda: {"json": item_body()}),
+        Scenario("update_item", "PUT", "/api/items/{item_id}",
+                 lambda: {"path": {"item_id": rng.choice(items)['id']}, "json": item_body()}),
+        Scenario("import_items", "POST", "/api/items/import", lambda: csv_upload(200), 0.05),
+        Scenario("search", "GET", "/api/search",
+                 lambda: {"params": {"q": rng.choice(["item", "sku", "supplier"]), "kind": rng.choice(["items", "suppliers"])}}),
+        Scenario("typeahead", "GET", "/api/search/typeahead",
+                 lambda: {"params": {"q": rng.choice(["i", "it", "ite", "sku-", "sup"])}}),
+        Scenario("get_prs", "GET", "/api/purchase-requisitions", lambda: page),
+        Scenario("create_pr", "POST", "/api/purchase-requisitions", lambda: {"json": {
+            "requester_id": "bench", "requester_name": "Bench", "department": rng.choice(DEPARTMENTS),
+            "items": line_payload(3)}}),
+        Scenario("approve_pr", "PUT", "/api/purchase-requisitions/{pr_id}/approve",
+                 lambda: {"path": {"pr_id": rng.choice(prs)['id']}}),
+        Scenario("get_pos", "GET", "/api/purchase-orders", lambda: page),
+        Scenario("get_po", "GET", "/api/purchase-orders/{po_id}",
+                 lambda: {"path": {"po_id": rng.choice(pos)['id']}}),
+        Scenario("create_po", "POST", "/api/purchase-orders", lambda: {"json": po_body()}),
+        Scenario("approve_po", "PUT", "/api/purchase-orders/{po_id}/approve",
+                 lambda: {"path": {"po_id": rng.choice(pos)['id']}, "params": {"approver_id": f"bench-{unique()}"}}),
+        Scenario("approve_pos", "POST", "/api/purchase-orders/approve", lambda: {"json": {
+            "po_ids": [po['id'] for po in rng.sample(pos, 20)], "approver_id": f"bench-{unique()}"}}, 0.2),
+        Scenario("download_po_pdf", "GET", "/api/purchase-orders/{po_id}/pdf",
+                 lambda: {"path": {"po_id": rng.choice(pos)['id']}}, 0.5),
+        Scenario("export_po_pdfs", "POST", "/api/purchase-orders/pdf-export",
+                 lambda: {"json": {"ids": [po['id'] for po in rng.sample(pos, 20)]}}, 0.05),
+        Scenario("get_grs", "GET", "/api/goods-receipts", lambda: page),
+        Scenario("create_gr", "POST", "/api/goods-receipts", lambda: {"json": gr_body()}),
+        Scenario("create_gr_batch", "POST", "/api/goods-receipts/batch",
+                 lambda: {"json": [gr_body() for _ in range(20)]}, 0.1),
+        Scenario("get_invoices", "GET", "/api/invoices", lambda: page),
+        Scenario("create_invoice", "POST", "/api/invoices", lambda: {"json": {
+            **{k: v for k, v in gr_body().items() if k != "received_by"},
+            "supplier_id": rng.choice(suppliers)['id']}}),
+        Scenario("export_pos_csv", "GET", "/api/exports/{dataset}",
+                 lambda: {"path": {"dataset": "purchase-orders"}}, 0.05),
+        Scenario("export_invoices_xlsx", "GET", "/api/exports/{dataset}",
+                 lambda: {"path": {"dataset": "invoices"}, "params": {"format": "xlsx"}}, 0.05),
+        Scenario("reorder_dry_run", "POST", "/api/replenishment/reorder-run",
+                 lambda: {"json": {"dry_run": True}}, 0.05),
+        Scenario("get_jobs", "GET", "/api/jobs", lambda: {}),
+        Scenario("get_job", "GET", "/api/jobs/{job_id}", lambda: {"path": {"job_id": data['job_id']}}),
+        Scenario("get_job_result", "GET", "/api/jobs/{job_id}/result", lambda: {"path": {"job_id": data['job_id']}}),
+        Scenario("health_live", "GET", "/api/health/live", lambda: {}),
+        Scenario("health_ready", "GET", "/api/health/ready", lambda: {}),
+        Scenario("dashboard_stats", "GET", "/api/dashboard/stats", lambda: {}),
+        Scenario("metrics", "GET", "/api/metrics", lambda: {}, 0.2),
+        Scenario("query_plans", "GET", "/api/admin/query-plans", lambda: {}, 0.05),
+        Scenario("backfill_counters", "POST", "/api/admin/counters/backfill", lambda: {}, 0.05),
+        Scenario("native_dates_migration", "POST", "/api/admin/migrations/native-dates", lambda: {}, 0.05),
+    ]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(base_url, scenario, total, concurrency, token=None):
+    # Build payloads up front so generation cost isn't measured
+    calls = [scenario.build() for _ in range(total)]
+    local = threading.local()
+
+    def one(call):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            if token:
+                local.session.headers["Authorization"] = f"Bearer {token}"
+        session = local.session
+        url = base_url + scenario.template.format(**call.get('path', {}))
+        started = time.perf_counter()
+        try:
+            response = session.request(scenario.method, url, params=call.get('params'),
+                                       json=call.get('json'), files=call.get('files'), timeout=120)
+            response.content
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, calls))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    errors = sum(1 for r in results if not r[1])
+    return {
+        "method": scenario.method,
+        "path": scenario.template,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / wall, 2) if wall else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def uncovered_routes(scenarios):
+    covered = {(s.method, s.template) for s in scenarios}
+    missing = []
+    for route in server.api_router.routes:
+        for method in getattr(route, 'methods', ()):
+            if (method, route.path) not in covered:
+                missing.append(f"{method} {route.path}")
+    return sorted(missing)
+
+
+# Server management
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(workers, bcrypt_rounds, max_pool_size=None):
+    port = free_port()
+    env = {**os.environ, "DB_NAME": BENCH_DB_NAME, "BCRYPT_ROUNDS": str(bcrypt_rounds)}
+    if max_pool_size:
+        env["MONGO_MAX_POOL_SIZE"] = str(max_pool_size)
+    # Tokens must verify on every worker
+    env.setdefault("JWT_SECRET", uuid.uuid4().hex)
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=ROOT_DIR, env={**env, "JOB_WORKERS": "0"},
+        ),
+        # Background jobs run outside the web workers, as in production
+        subprocess.Popen([sys.executable, "worker.py"], cwd=ROOT_DIR, env=env),
+    ]
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/health/ready", timeout=2).ok:
+                return processes, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    for process in processes:
+        process.terminate()
+    raise RuntimeError("Server did not become ready within 60s")
+
+
+def register_users(base_url, count):
+    emails = []
+    for i in range(count):
+        email = f"bench-user-{i}@example.com"
+        requests.post(f"{base_url}/api/auth/register", json={
+            "email": email, "name": f"Bench {i}", "role": "purchaser", "password": BENCH_PASSWORD,
+        }, timeout=30).raise_for_status()
+        emails.append(email)
+    return emails
+
+
+def submit_job(base_url, token, path, params=None, wait=True):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = requests.post(f"{base_url}{path}", params={**(params or {}), "background": "true"},
+                             headers=headers, timeout=30)
+    response.raise_for_status()
+    job = response.json()
+    deadline = time.monotonic() + 300
+    while wait and job['status'] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.5)
+        job = requests.get(f"{base_url}/api/jobs/{job['id']}", headers=headers, timeout=30).json()
+    return job
+
+
+def login_tokens(base_url, emails):
+    tokens = []
+    for email in emails:
+        response = requests.post(f"{base_url}/api/auth/login",
+                                 json={"email": email, "password": BENCH_PASSWORD}, timeout=30)
+        response.raise_for_status()
+        tokens.append(response.json()['token'])
+    return tokens
+
+
+# Comparison
+def compare(current, baseline, threshold):
+    regressions = []
+    for name, result in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        if before.get('p95_ms') and result.get('p95_ms') and result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms")
+        if before.get('throughput_rps') and result.get('throughput_rps') \
+                and result['throughput_rps'] < before['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s")
+        if result['errors'] > before.get('errors', 0):
+            regressions.append(f"{name}: errors {before.get('errors', 0)} -> {result['errors']}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Benchmark an already running server (must use the bench DB)")
+    parser.add_argument("--spawn-server", action="store_true", help="Start uvicorn against the bench DB")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for --spawn-server")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="BCRYPT_ROUNDS for --spawn-server")
+    parser.add_argument("--max-pool-size", type=int, help="MONGO_MAX_POOL_SIZE for --spawn-server")
+    parser.add_argument("--background-jobs", type=int, default=0,
+                        help="Queue this many export and rebuild jobs so scenarios run alongside batch work")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint before weighting")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already in the bench DB")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative regression")
+    for name, default in DEFAULT_VOLUMES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default, dest=name)
+    args = parser.parse_args()
+
+    if not args.base_url and not args.spawn_server:
+        parser.error("pass --base-url or --spawn-server")
+
+    rng = random.Random(args.seed)
+    volumes = {name: getattr(args, name) for name in DEFAULT_VOLUMES}
+    database = MongoClient(os.environ['MONGO_URL'], tz_aware=True)[BENCH_DB_NAME]
+    if args.skip_seed:
+        data = {
+            "suppliers": list(database.suppliers.find({}, {"_id": 0})),
+            "items": list(database.items.find({}, {"_id": 0})),
+            "prs": list(database.purchase_requisitions.find({}, {"_id": 0})),
+            "pos": list(database.purchase_orders.find({}, {"_id": 0})),
+        }
+    else:
+        print(f"Seeding {BENCH_DB_NAME}: {volumes}")
+        data = seed(database, volumes, rng)
+
+    processes = []
+    base_url = args.base_url
+    if args.spawn_server:
+        processes, base_url = spawn_server(args.workers, args.bcrypt_rounds, args.max_pool_size)
+    try:
+        data['users'] = register_users(base_url, BENCH_USERS) if not args.skip_seed else [
+            u['email'] for u in database.users.find({"email": {"$regex": "^bench-user-"}}, {"email": 1})
+        ]
+        # Every request carries a token, so runs also work against AUTH_REQUIRED servers
+        token = login_tokens(base_url, data['users'][:1])[0]
+        data['job_id'] = submit_job(base_url, token, "/api/analytics/spend/rebuild")['id']
+        for i in range(args.background_jobs):
+            if i % 2:
+                submit_job(base_url, token, "/api/analytics/spend/rebuild", wait=False)
+            else:
+                submit_job(base_url, token, "/api/exports/purchase-orders", {"format": "xlsx"}, wait=False)
+        scenarios = build_scenarios(data, rng, args.page_size)
+        for route in uncovered_routes(scenarios):
+            print(f"warning: no scenario for {route}")
+        if args.only:
+            scenarios = [s for s in scenarios if s.name in args.only]
+
+        results = {}
+        for scenario in scenarios:
+            total = max(1, int(args.requests * scenario.weight))
+            results[scenario.name] = run_scenario(base_url, scenario, total, args.concurrency, token)
+            r = results[scenario.name]
+            print(f"{scenario.name:28s} {r['throughput_rps'] or 0:9.1f} req/s  p50 {r['p50_ms']:8.1f}ms  "
+                  f"p95 {r['p95_ms']:8.1f}ms  p99 {r['p99_ms']:8.1f}ms  errors {r['errors']}")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "volumes": volumes,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "page_size": args.page_size,
+            "workers": args.workers if args.spawn_server else None,
+            "bcrypt_rounds": args.bcrypt_rounds if args.spawn_server else None,
+            "max_pool_size": args.max_pool_size if args.spawn_server else None,
+            "background_jobs": args.background_jobs,
+        },
+        "endpoints": results,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"Wrote {args.out}")
+
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,337 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, Header, UploadFile, File
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument, UpdateOne, UpdateMany, InsertOne, CursorType, monitoring
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo.errors import OperationFailure, BulkWriteError, CollectionInvalid, DuplicateKeyError, PyMongoError
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
 import os
+import io
+import csv
+import json
+import base64
+import asyncio
+import time
+import hashlib
+import hmac
+import secrets
+import zipfile
+import re
+import bisect
+import threading
+import tempfile
+import socket
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError, TypeAdapter
+from starlette.datastructures import Headers
+from typing import Any, List, NamedTuple, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 from enum import Enum
+from collections import OrderedDict
+from xml.sax.saxutils import escape as xml_escape
+from contextvars import ContextVar
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from io import BytesIO
 from fpdf import FPDF
+import bcrypt
+import jwt
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Metrics
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Log requests slower than this, with the Mongo commands they issued; 0 disables
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '0'))
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def prometheus_labels(**labels) -> str:
+    escaped = (
+        f'{k}="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for k, v in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+class MetricsRegistry:
+    # Updated from request handlers and from PyMongo's executor threads
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.request_latency = {}
+        self.commands = {}
+        self.command_failures = {}
+        self.cache_lookups = {}
+        self.cache_entries = {}
+        self.pools = {}
+        self.checkout_failures = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        with self._lock:
+            key = (method, route, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.request_latency.setdefault((method, route), Histogram()).observe(seconds)
+
+    def observe_command(self, collection: str, command: str, seconds: float, failed: bool):
+        with self._lock:
+            self.commands.setdefault((collection, command), Histogram()).observe(seconds)
+            if failed:
+                key = (collection, command)
+                self.command_failures[key] = self.command_failures.get(key, 0) + 1
+
+    def observe_cache(self, cache: str, hits: int, misses: int, entries: int):
+        with self._lock:
+            for result, count in (("hit", hits), ("miss", misses)):
+                if count:
+                    self.cache_lookups[(cache, result)] = self.cache_lookups.get((cache, result), 0) + count
+            self.cache_entries[cache] = entries
+
+    def observe_pool(self, address: str, **deltas):
+        with self._lock:
+            pool = self.pools.setdefault(address, {"open": 0, "in_use": 0, "waiting": 0})
+            for state, delta in deltas.items():
+                pool[state] += delta
+
+    def observe_checkout_failure(self, address: str, reason: str):
+        with self._lock:
+            key = (address, reason)
+            self.checkout_failures[key] = self.checkout_failures.get(key, 0) + 1
+
+    def pool_stats(self) -> dict:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self.pools.items()}
+
+    def _histogram_lines(self, name: str, series: dict, label_names) -> List[str]:
+        lines = []
+        for key, histogram in sorted(series.items()):
+            labels = dict(zip(label_names, key))
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{prometheus_labels(**labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{prometheus_labels(**labels)} {histogram.sum}")
+            lines.append(f"{name}_count{prometheus_labels(**labels)} {histogram.count}")
+        return lines
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP http_requests_total HTTP requests by route template and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{prometheus_labels(method=method, route=route, status=status)} {count}")
+            lines += [
+                "# HELP http_request_duration_seconds HTTP request latency by route template.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            lines += self._histogram_lines("http_request_duration_seconds", self.request_latency, ("method", "route"))
+            lines += [
+                "# HELP mongo_command_duration_seconds MongoDB command latency by collection and command.",
+                "# TYPE mongo_command_duration_seconds histogram",
+            ]
+            lines += self._histogram_lines("mongo_command_duration_seconds", self.commands, ("collection", "command"))
+            lines += [
+                "# HELP mongo_command_failures_total Failed MongoDB commands by collection and command.",
+                "# TYPE mongo_command_failures_total counter",
+            ]
+            for (collection, command), count in sorted(self.command_failures.items()):
+                lines.append(f"mongo_command_failures_total{prometheus_labels(collection=collection, command=command)} {count}")
+            lines += [
+                "# HELP cache_lookups_total Read-through cache lookups by cache and result.",
+                "# TYPE cache_lookups_total counter",
+            ]
+            for (cache, result), count in sorted(self.cache_lookups.items()):
+                lines.append(f"cache_lookups_total{prometheus_labels(cache=cache, result=result)} {count}")
+            lines += [
+                "# HELP cache_entries Entries held by each read-through cache at its last lookup.",
+                "# TYPE cache_entries gauge",
+            ]
+            for cache, entries in sorted(self.cache_entries.items()):
+                lines.append(f"cache_entries{prometheus_labels(cache=cache)} {entries}")
+            lines += [
+                "# HELP mongo_pool_connections MongoDB pool connections by server and state.",
+                "# TYPE mongo_pool_connections gauge",
+            ]
+            for address, pool in sorted(self.pools.items()):
+                for state in ("open", "in_use", "waiting"):
+                    lines.append(f"mongo_pool_connections{prometheus_labels(address=address, state=state)} {pool[state]}")
+            lines += [
+                "# HELP mongo_pool_checkout_failures_total Failed connection check-outs by server and reason.",
+                "# TYPE mongo_pool_checkout_failures_total counter",
+            ]
+            for (address, reason), count in sorted(self.checkout_failures.items()):
+                lines.append(f"mongo_pool_checkout_failures_total{prometheus_labels(address=address, reason=reason)} {count}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+# Mongo commands issued by the current request, for the slow-request log
+request_commands = ContextVar('request_commands', default=None)
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMore names its collection separately; admin commands have none
+            collection = event.command.get('collection', '')
+        with self._lock:
+            self._collections[(event.request_id, event.connection_id)] = collection
+
+    def _finished(self, event, failed: bool):
+        with self._lock:
+            collection = self._collections.pop((event.request_id, event.connection_id), '')
+        seconds = event.duration_micros / 1e6
+        self.registry.observe_command(collection, event.command_name, seconds, failed)
+        commands = request_commands.get()
+        if commands is not None:
+            commands.append((event.command_name, collection, round(seconds * 1000, 2)))
+
+    def succeeded(self, event):
+        self._finished(event, False)
+
+    def failed(self, event):
+        self._finished(event, True)
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    # waiting counts check-outs queued for a connection; a timeout there is pool exhaustion
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+
+    def connection_created(self, event):
+        self.registry.observe_pool(pool_address(event), open=1)
+
+    def connection_closed(self, event):
+        self.registry.observe_pool(pool_address(event), open=-1)
+
+    def connection_check_out_started(self, event):
+        self.registry.observe_pool(pool_address(event), waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self.registry.observe_pool(pool_address(event), waiting=-1)
+        self.registry.observe_checkout_failure(pool_address(event), event.reason)
+
+    def connection_checked_out(self, event):
+        self.registry.observe_pool(pool_address(event), waiting=-1, in_use=1)
+
+    def connection_checked_in(self, event):
+        self.registry.observe_pool(pool_address(event), in_use=-1)
+
+    def pool_created(self, event):
+        self.registry.observe_pool(pool_address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+def pool_address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+class MetricsMiddleware:
+    # Plain ASGI middleware so streamed responses are timed to their last byte
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+        commands = []
+        token = request_commands.set(commands)
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_commands.reset(token)
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            metrics.observe_request(scope['method'], route, status[0], elapsed)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(
+                    "Slow request %s %s took %.1fms (status %s); mongo commands: %s",
+                    scope['method'], route, elapsed * 1000, status[0], commands
+                )
+
+# Database client
+# Created by the lifespan (connect_database) and closed on shutdown, so
+# importing this module needs neither MONGO_URL nor an event loop. Pool,
+# timeout, compression and read preference options are read from the
+# environment when set; otherwise MONGO_URL's options and the driver defaults
+# apply. The lifespan warms the pool before the app takes traffic. A
+# secondary read preference lets reads miss a write the same request just made.
+# env var -> (client option, parser)
+MONGO_CLIENT_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': ('maxPoolSize', int),
+    'MONGO_MIN_POOL_SIZE': ('minPoolSize', int),
+    'MONGO_MAX_CONNECTING': ('maxConnecting', int),
+    'MONGO_MAX_IDLE_TIME_MS': ('maxIdleTimeMS', int),
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int),
+    'MONGO_CONNECT_TIMEOUT_MS': ('connectTimeoutMS', int),
+    'MONGO_SOCKET_TIMEOUT_MS': ('socketTimeoutMS', int),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS', int),
+    # e.g. zstd,snappy,zlib; zstd and snappy need their Python packages
+    'MONGO_COMPRESSORS': ('compressors', str),
+    'MONGO_READ_PREFERENCE': ('readPreference', str),
+}
+# Connections opened at startup, capped at the pool size
+MONGO_WARM_CONNECTIONS = int(os.environ.get('MONGO_WARM_CONNECTIONS', '10'))
+# Documents read per hot query shape at startup, to pull in the leading index pages
+MONGO_WARM_DOCS = int(os.environ.get('MONGO_WARM_DOCS', '100'))
+
+def mongo_client_options() -> dict:
+    return {
+        option: parse(os.environ[name])
+        for name, (option, parse) in MONGO_CLIENT_OPTIONS.items()
+        if os.environ.get(name)
+    }
+
+client: Optional[AsyncIOMotorClient] = None
+db = None
 
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 # Enums
@@ -53,18 +363,34 @@ class User(BaseModel):
     email: EmailStr
     name: str
     role: UserRole
-    password: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserCreate(BaseModel):
     email: EmailStr
     name: str
     role: UserRole
-    password: str
+    password: str = Field(min_length=1)
 
 class LoginRequest(BaseModel):
     email: EmailStr
-    password: str
+    password: str = Field(min_length=1)
+
+class SupplierScorecard(BaseModel):
+    # Running totals, maintained by receipts and invoices
+    receipts: int = 0
+    lead_time_days_total: float = 0
+    dated_receipts: int = 0
+    on_time_receipts: int = 0
+    ordered_qty: float = 0
+    received_qty: float = 0
+    invoiced_amount: float = 0
+    invoiced_at_po_price: float = 0
+    # Derived from the totals; None until there is something to measure
+    avg_lead_time_days: Optional[float] = None
+    on_time_rate: Optional[float] = None
+    fill_rate: Optional[float] = None
+    price_variance_pct: Optional[float] = None
+    updated_at: Optional[datetime] = None
 
 class Supplier(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -76,7 +402,9 @@ class Supplier(BaseModel):
     city: Optional[str] = None
     country: Optional[str] = None
     tax_id: Optional[str] = None
-    rating: float = 5.0
+    scorecard: SupplierScorecard = Field(default_factory=SupplierScorecard)
+    # 0-5, derived from the scorecard
+    rating: Optional[float] = None
     status: str = "active"
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -101,6 +429,8 @@ class Item(BaseModel):
     quantity: int = 0
     reorder_level: int = 10
     supplier_id: Optional[str] = None
+    is_low_stock: bool = False
+    shortfall: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ItemCreate(BaseModel):
@@ -171,6 +501,33 @@ class POCreate(BaseModel):
     notes: Optional[str] = None
     created_by: str
 
+class POPdfExportRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    status: Optional[ApprovalStatus] = None
+    supplier_id: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+    def query(self) -> dict:
+        query = {}
+        if self.ids is not None:
+            query["id"] = {"$in": self.ids}
+        if self.status:
+            query["status"] = self.status.value
+        if self.supplier_id:
+            query["supplier_id"] = self.supplier_id
+        query.update(created_range(self.created_from, self.created_to))
+        return query
+
+class POBatchApproval(BaseModel):
+    po_ids: List[str]
+    approver_id: str
+
+class POApprovalResult(BaseModel):
+    po_id: str
+    result: str
+    status: Optional[str] = None
+
 class GoodsReceipt(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -190,6 +547,22 @@ class GRCreate(BaseModel):
     received_by: str
     notes: Optional[str] = None
 
+class GRLineResult(BaseModel):
+    line: int
+    item_id: str
+    quantity: int
+    status: str
+    detail: Optional[str] = None
+
+class GoodsReceiptResult(GoodsReceipt):
+    line_results: List[GRLineResult] = []
+
+class GRBatchResult(BaseModel):
+    index: int
+    status: str
+    receipt: Optional[GoodsReceiptResult] = None
+    detail: Optional[str] = None
+
 class Invoice(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -214,6 +587,864 @@ class InvoiceCreate(BaseModel):
     tax_amount: float = 0
     due_date: Optional[datetime] = None
 
+# Stock status
+# is_low_stock/shortfall are stored on each item so the low-stock view is an
+# indexed lookup; every write that touches quantity or reorder_level refreshes them.
+def stock_status(quantity: int, reorder_level: int) -> dict:
+    return {
+        "is_low_stock": quantity <= reorder_level,
+        "shortfall": max(0, reorder_level - quantity),
+    }
+
+STOCK_STATUS_STAGE = {"$set": {
+    "is_low_stock": {"$lte": [{"$ifNull": ["$quantity", 0]}, {"$ifNull": ["$reorder_level", 0]}]},
+    "shortfall": {"$max": [0, {"$subtract": [{"$ifNull": ["$reorder_level", 0]}, {"$ifNull": ["$quantity", 0]}]}]},
+}}
+
+def receive_stock_update(quantity: int) -> list:
+    return [
+        {"$set": {"quantity": {"$add": [{"$ifNull": ["$quantity", 0]}, quantity]}}},
+        STOCK_STATUS_STAGE,
+    ]
+
+class LowStockSort(str, Enum):
+    SHORTFALL = "shortfall"
+    NAME = "name"
+
+# List pagination
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+NDJSON_BATCH_SIZE = 500
+KEYSET_SORT = [("created_at", 1), ("id", 1)]
+# Fields the keyset cursor needs, always projected
+CURSOR_FIELDS = ("id", "created_at")
+
+# Fast path: list pages go straight from Mongo to orjson without a second
+# Pydantic validation pass. RESPONSE_SCHEMA_CHECK re-enables validation of
+# fast-path pages (for CI and staging) so the stored shape can't drift.
+FAST_LIST_RESPONSES = os.environ.get('FAST_LIST_RESPONSES', 'false').lower() == 'true'
+RESPONSE_SCHEMA_CHECK = os.environ.get('RESPONSE_SCHEMA_CHECK', 'false').lower() == 'true'
+
+class ListFormat(str, Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
+
+def created_range(created_from: Optional[datetime], created_to: Optional[datetime]) -> dict:
+    created = {}
+    if created_from:
+        created["$gte"] = created_from
+    if created_to:
+        created["$lt"] = created_to
+    return {"created_at": created} if created else {}
+
+class ListParams:
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+        format: ListFormat = Query(ListFormat.JSON),
+        created_from: Optional[datetime] = Query(None),
+        created_to: Optional[datetime] = Query(None),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    ):
+        self.limit = limit
+        self.after = after
+        self.format = format
+        self.created_from = created_from
+        self.created_to = created_to
+        self.fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
+    def query(self) -> dict:
+        return created_range(self.created_from, self.created_to)
+
+    def projection(self, model) -> dict:
+        if not self.fields:
+            return {"_id": 0, "search_keys": 0}
+        unknown = [f for f in self.fields if f not in model.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return {"_id": 0, **{f: 1 for f in (*CURSOR_FIELDS, *self.fields)}}
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def dumps_json(content) -> bytes:
+    if orjson is None:
+        return json.dumps(content, default=json_default, separators=(",", ":")).encode()
+    # OPT_UTC_Z matches how Pydantic renders UTC datetimes
+    return orjson.dumps(content, default=json_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+def encode_cursor(doc: dict) -> str:
+    created_at = doc.get('created_at')
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    payload = json.dumps([created_at, doc['id']]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def decode_cursor(cursor: str):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, doc_id = json.loads(payload)
+        created_at = datetime.fromisoformat(created_at)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, doc_id
+
+def keyset_query(query: dict, after: Optional[str]) -> dict:
+    if not after:
+        return query
+    created_at, doc_id = decode_cursor(after)
+    keyset = {"$or": [
+        {"created_at": {"$gt": created_at}},
+        {"created_at": created_at, "id": {"$gt": doc_id}},
+    ]}
+    return {"$and": [query, keyset]} if query else keyset
+
+async def fetch_page(collection, query: dict, projection: dict, params: ListParams):
+    # Fetch one extra row to know whether another page exists
+    cursor = collection.find(keyset_query(query, params.after), projection).sort(KEYSET_SORT)
+    docs = await cursor.limit(params.limit + 1).to_list(params.limit + 1)
+    if len(docs) > params.limit:
+        docs = docs[:params.limit]
+        return docs, encode_cursor(docs[-1])
+    return docs, None
+
+def stream_ndjson(collection, query: dict, projection: dict, params: ListParams) -> StreamingResponse:
+    # Resolve the cursor before streaming so a bad cursor is still a 400
+    keyset = keyset_query(query, params.after)
+
+    async def rows():
+        cursor = collection.find(keyset, projection).sort(KEYSET_SORT).batch_size(NDJSON_BATCH_SIZE)
+        buffer = []
+        async for doc in cursor:
+            buffer.append(dumps_json(doc))
+            if len(buffer) >= NDJSON_BATCH_SIZE:
+                yield b"\n".join(buffer) + b"\n"
+                buffer = []
+        if buffer:
+            yield b"\n".join(buffer) + b"\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+def check_documents(model, docs: List[dict]):
+    try:
+        TypeAdapter(List[model]).validate_python(docs)
+    except ValidationError as e:
+        logger.error("Stored %s documents no longer match the response schema: %s", model.__name__, e)
+        raise HTTPException(status_code=500, detail="Response schema check failed")
+
+async def list_documents(collection, model, params: ListParams, response: Response, query: Optional[dict] = None):
+    query = {**params.query(), **(query or {})}
+    projection = params.projection(model)
+    if params.format == ListFormat.NDJSON:
+        return stream_ndjson(collection, query, projection, params)
+    docs, next_cursor = await fetch_page(collection, query, projection, params)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    # Partial documents can't pass response_model validation, so projections
+    # always take the fast path
+    if FAST_LIST_RESPONSES or params.fields:
+        if RESPONSE_SCHEMA_CHECK and not params.fields:
+            check_documents(model, docs)
+        return FastJSONResponse(docs, headers=headers)
+    response.headers.update(headers)
+    return docs
+
+# In-process caching
+class TTLCache:
+    # Bounded LRU whose entries also expire after ttl seconds
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+# Read-through cache
+# Point lookups by id on the catalog and PO collections. Write routes evict the
+# ids they touch. With CACHE_BROADCAST enabled, evictions are also appended to a
+# capped collection that every worker tails, so all workers on the deployment
+# drop them; a worker that loses its tail clears everything it holds. Broadcast
+# is always on for worker.py and for web processes that leave jobs to it
+# (JOB_WORKERS=0), since background imports change items and suppliers there.
+LOOKUP_CACHE_COLLECTIONS = ("suppliers", "items", "purchase_orders")
+LOOKUP_CACHE_TTL = float(os.environ.get('LOOKUP_CACHE_TTL', '60'))
+LOOKUP_CACHE_SIZE = int(os.environ.get('LOOKUP_CACHE_SIZE', '10000'))
+CACHE_BROADCAST = os.environ.get('CACHE_BROADCAST', 'false').lower() == 'true'
+CACHE_INVALIDATIONS = "cache_invalidations"
+CACHE_INVALIDATIONS_BYTES = 16 * 1024 * 1024
+
+class DocumentCache:
+    # Returned documents are shared with the cache; callers must not mutate them
+    def __init__(self, database, collections, ttl: float, maxsize: int, broadcast: bool = False):
+        self.db = database
+        self.caches = {name: TTLCache(ttl, maxsize) for name in collections}
+        # Bumped on every eviction so a read racing a write doesn't cache the old document
+        self.generations = {name: 0 for name in collections}
+        self.broadcast = broadcast
+        self.origin = str(uuid.uuid4())
+        # async callables (collection, ids or None) run for evictions from other workers
+        self.listeners = []
+        self._tail_task = None
+
+    async def get(self, collection: str, doc_id: str) -> Optional[dict]:
+        return (await self.get_many(collection, [doc_id])).get(doc_id)
+
+    async def get_many(self, collection: str, ids) -> dict:
+        cache = self.caches[collection]
+        found, missing = {}, []
+        requested = list(dict.fromkeys(ids))
+        for doc_id in requested:
+            doc = cache.get(doc_id)
+            if doc is None:
+                missing.append(doc_id)
+            else:
+                found[doc_id] = doc
+        if missing:
+            generation = self.generations[collection]
+            async for doc in self.db[collection].find({"id": {"$in": missing}}, {"_id": 0, "search_keys": 0}):
+                found[doc['id']] = doc
+                if generation == self.generations[collection]:
+                    cache.set(doc['id'], doc)
+        metrics.observe_cache(collection, len(requested) - len(missing), len(missing), len(cache))
+        return found
+
+    def _evict(self, collection: str, ids: Optional[List[str]]):
+        if collection not in self.caches:
+            return
+        self.generations[collection] += 1
+        if ids is None:
+            self.caches[collection].invalidate()
+        else:
+            for doc_id in ids:
+                self.caches[collection].invalidate(doc_id)
+
+    async def invalidate(self, collection: str, ids: Optional[List[str]] = None):
+        # ids=None evicts the whole collection
+        self._evict(collection, ids)
+        if self.broadcast:
+            await self.db[CACHE_INVALIDATIONS].insert_one({
+                "origin": self.origin, "collection": collection, "ids": ids, "at": datetime.now(timezone.utc),
+            })
+
+    async def start(self):
+        if not self.broadcast:
+            return
+        try:
+            await self.db.create_collection(CACHE_INVALIDATIONS, capped=True, size=CACHE_INVALIDATIONS_BYTES)
+            # A tailable cursor on an empty capped collection dies immediately
+            await self.db[CACHE_INVALIDATIONS].insert_one({"origin": None, "collection": None, "ids": None})
+        except CollectionInvalid:
+            pass
+        self._tail_task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._tail_task:
+            self._tail_task.cancel()
+            try:
+                await self._tail_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _notify(self, collection: str, ids: Optional[List[str]]):
+        self._evict(collection, ids)
+        for listener in self.listeners:
+            await listener(collection, ids)
+
+    async def _tail(self):
+        events = self.db[CACHE_INVALIDATIONS]
+        # ObjectIds order by creation time, which holds for workers sharing a host clock
+        last = await events.find_one({}, {"_id": 1}, sort=[("$natural", -1)])
+        query = {"_id": {"$gt": last['_id']}} if last else {}
+        while True:
+            try:
+                # A cursor with nothing new to return can die; it's reopened from
+                # the last seen event after a short sleep
+                cursor = events.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for event in cursor:
+                        query = {"_id": {"$gt": event['_id']}}
+                        if event['origin'] not in (self.origin, None):
+                            await self._notify(event['collection'], event['ids'])
+            except PyMongoError as e:
+                logger.warning("Cache invalidation tail interrupted: %s", e)
+                # Events may have been missed while the connection was down
+                for collection in self.caches:
+                    await self._notify(collection, None)
+            await asyncio.sleep(1)
+
+lookup_cache = DocumentCache(None, LOOKUP_CACHE_COLLECTIONS, LOOKUP_CACHE_TTL, LOOKUP_CACHE_SIZE, CACHE_BROADCAST)
+
+# Search index
+# Items and suppliers store lowercased search_keys (each searchable value and
+# its words) so a prefix search is a range scan on a multikey index. The text
+# index covers word matches. PrefixIndex keeps the same keys in memory for
+# typeahead and is updated by the item/supplier write routes.
+class SearchKind(str, Enum):
+    ITEMS = "items"
+    SUPPLIERS = "suppliers"
+
+# kind -> searchable fields, the identifying code first
+SEARCH_FIELDS = {
+    SearchKind.ITEMS: ("sku", "name", "category"),
+    SearchKind.SUPPLIERS: ("tax_id", "name"),
+}
+SEARCH_WORD_SPLIT = re.compile(r"[^\w]+")
+# Keys examined per typeahead lookup before ranking
+TYPEAHEAD_SCAN_LIMIT = 2000
+
+class SearchHit(BaseModel):
+    kind: SearchKind
+    id: str
+    name: str
+    code: Optional[str] = None
+    category: Optional[str] = None
+
+def normalize_search(value: str) -> str:
+    return " ".join(str(value).lower().split())
+
+def search_keys(kind: SearchKind, doc: dict) -> List[str]:
+    keys = set()
+    for field in SEARCH_FIELDS[kind]:
+        value = normalize_search(doc.get(field) or "")
+        if value:
+            keys.add(value)
+            keys.update(word for word in SEARCH_WORD_SPLIT.split(value) if word)
+    return sorted(keys)
+
+def search_fields(kind: SearchKind, doc: dict) -> dict:
+    return {"search_keys": search_keys(kind, doc)}
+
+def search_hit(kind: SearchKind, doc: dict) -> dict:
+    code, *_ = SEARCH_FIELDS[kind]
+    return {"kind": kind, "id": doc['id'], "name": doc.get('name', ""), "code": doc.get(code), "category": doc.get('category')}
+
+def search_projection(kind: SearchKind) -> dict:
+    return {"_id": 0, "id": 1, "name": 1, **{f: 1 for f in SEARCH_FIELDS[kind]}}
+
+def search_rank(hit: dict, prefix: str):
+    # Exact code or name, then code prefix, then name prefix, then word prefix
+    code = normalize_search(hit['code'] or "")
+    name = normalize_search(hit['name'])
+    if prefix in (code, name):
+        rank = 0
+    elif code.startswith(prefix):
+        rank = 1
+    elif name.startswith(prefix):
+        rank = 2
+    else:
+        rank = 3
+    return rank, name, hit['id']
+
+class PrefixIndex:
+    def __init__(self):
+        self.keys = {kind: [] for kind in SearchKind}  # sorted (key, id)
+        self.entries = {kind: {} for kind in SearchKind}  # id -> (hit, keys)
+        self.pending = {}  # kind -> docs written while a load is running
+
+    def put(self, kind: SearchKind, doc: dict):
+        if kind in self.pending:
+            self.pending[kind].append(doc)
+        keys = self.keys[kind]
+        old = self.entries[kind].pop(doc['id'], None)
+        if old:
+            for key in old[1]:
+                i = bisect.bisect_left(keys, (key, doc['id']))
+                if i < len(keys) and keys[i] == (key, doc['id']):
+                    del keys[i]
+        doc_keys = search_keys(kind, doc)
+        self.entries[kind][doc['id']] = (search_hit(kind, doc), doc_keys)
+        for key in doc_keys:
+            bisect.insort(keys, (key, doc['id']))
+
+    def search(self, prefix: str, kinds, limit: int) -> List[dict]:
+        hits = {}
+        for kind in kinds:
+            keys, entries = self.keys[kind], self.entries[kind]
+            start = bisect.bisect_left(keys, (prefix,))
+            for key, doc_id in keys[start:start + TYPEAHEAD_SCAN_LIMIT]:
+                if not key.startswith(prefix):
+                    break
+                hits[(kind, doc_id)] = entries[doc_id][0]
+        return sorted(hits.values(), key=lambda hit: search_rank(hit, prefix))[:limit]
+
+    async def load(self, database, kind: SearchKind, batch_size: int = 1000):
+        # Rebuilds one kind from Mongo, storing search_keys on documents that lack them
+        self.pending[kind] = []
+        keys, entries, backfill = [], {}, []
+        try:
+            projection = {**search_projection(kind), "search_keys": 1}
+            async for doc in database[kind.value].find({}, projection).batch_size(batch_size):
+                doc_keys = doc.get('search_keys')
+                if doc_keys is None:
+                    doc_keys = search_keys(kind, doc)
+                    backfill.append(UpdateOne({"id": doc['id']}, {"$set": {"search_keys": doc_keys}}))
+                    if len(backfill) >= batch_size:
+                        await database[kind.value].bulk_write(backfill, ordered=False)
+                        backfill = []
+                entries[doc['id']] = (search_hit(kind, doc), doc_keys)
+                keys.extend((key, doc['id']) for key in doc_keys)
+            if backfill:
+                await database[kind.value].bulk_write(backfill, ordered=False)
+            keys.sort()
+            self.keys[kind], self.entries[kind] = keys, entries
+        finally:
+            pending = self.pending.pop(kind)
+        for doc in pending:
+            self.put(kind, doc)
+
+search_index = PrefixIndex()
+
+async def refresh_search_index(collection: str, ids: Optional[List[str]]):
+    # Applies item/supplier writes made by other workers to this worker's index
+    if collection not in {kind.value for kind in SearchKind}:
+        return
+    kind = SearchKind(collection)
+    if ids is None:
+        await search_index.load(db, kind)
+        return
+    async for doc in db[collection].find({"id": {"$in": ids}}, search_projection(kind)):
+        search_index.put(kind, doc)
+
+lookup_cache.listeners.append(refresh_search_index)
+
+async def search_documents(kind: SearchKind, q: str, limit: int, offset: int) -> List[dict]:
+    # Tiers in rank order: exact key, key prefix, text match. Each tier
+    # excludes the earlier ones so offsets page through a stable order.
+    prefix = re.compile("^" + re.escape(q))
+    by_name = [("name", 1), ("id", 1)]
+    tiers = [
+        ({"search_keys": q}, by_name),
+        ({"search_keys": {"$regex": prefix, "$ne": q}}, by_name),
+    ]
+    if SEARCH_WORD_SPLIT.sub("", q):
+        tiers.append(({"$text": {"$search": q}, "search_keys": {"$not": prefix}}, [("score", {"$meta": "textScore"})]))
+    collection = db[kind.value]
+    hits = []
+    for query, sort in tiers:
+        if len(hits) >= limit:
+            break
+        count = await collection.count_documents(query)
+        if offset >= count:
+            offset -= count
+            continue
+        projection = search_projection(kind)
+        if "$text" in query:
+            projection["score"] = {"$meta": "textScore"}
+        wanted = limit - len(hits)
+        docs = await collection.find(query, projection).sort(sort).skip(offset).limit(wanted).to_list(wanted)
+        hits.extend(search_hit(kind, doc) for doc in docs)
+        offset = 0
+    return hits
+
+# Document number sequences
+# name -> (collection, number field, prefix)
+SEQUENCES = {
+    "pr": ("purchase_requisitions", "pr_number", "PR"),
+    "po": ("purchase_orders", "po_number", "PO"),
+    "gr": ("goods_receipts", "gr_number", "GR"),
+    "invoice": ("invoices", "invoice_number", "INV"),
+}
+
+class SequenceCounter:
+    # Numbers come from $inc on the counters collection. With lease_size > 1
+    # each worker reserves a block per round trip, so numbers stay unique but
+    # may be non-contiguous across workers and after restarts.
+    def __init__(self, database, lease_size: int = 1):
+        self.db = database
+        self.lease_size = max(1, lease_size)
+        self._leases = {}
+        self._locks = {}
+
+    async def _reserve(self, name: str, count: int) -> int:
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter['seq']
+
+    async def next_value(self, name: str) -> int:
+        if self.lease_size == 1:
+            return await self._reserve(name, 1)
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            lease = self._leases.get(name)
+            if lease is None or lease[0] > lease[1]:
+                end = await self._reserve(name, self.lease_size)
+                lease = [end - self.lease_size + 1, end]
+                self._leases[name] = lease
+            value = lease[0]
+            lease[0] += 1
+            return value
+
+    async def next_number(self, name: str) -> str:
+        _, _, prefix = SEQUENCES[name]
+        return f"{prefix}-{await self.next_value(name):05d}"
+
+    async def next_numbers(self, name: str, count: int) -> List[str]:
+        # Reserve a contiguous block for batch inserts in one round trip
+        if count <= 0:
+            return []
+        _, _, prefix = SEQUENCES[name]
+        end = await self._reserve(name, count)
+        return [f"{prefix}-{value:05d}" for value in range(end - count + 1, end + 1)]
+
+    async def backfill(self, only_missing: bool = False) -> dict:
+        # Seed counters from the highest number already issued; $max keeps it idempotent
+        seeded = {}
+        for name, (collection, field, _) in SEQUENCES.items():
+            if only_missing and await self.db.counters.find_one({"_id": name}):
+                continue
+            pipeline = [
+                {"$match": {field: {"$type": "string"}}},
+                {"$group": {"_id": None, "max": {"$max": {
+                    "$convert": {
+                        "input": {"$arrayElemAt": [{"$split": [f"${field}", "-"]}, -1]},
+                        "to": "int",
+                        "onError": 0,
+                        "onNull": 0,
+                    }
+                }}}},
+            ]
+            result = await self.db[collection].aggregate(pipeline).to_list(1)
+            highest = result[0]['max'] if result else 0
+            await self.db.counters.update_one({"_id": name}, {"$max": {"seq": highest}}, upsert=True)
+            seeded[name] = highest
+        return seeded
+
+sequences = SequenceCounter(None, int(os.environ.get('COUNTER_LEASE_SIZE', '1')))
+
+# Transactions
+# Multi-document transactions need a replica set; on a standalone server we
+# fall back to running the same operations without a session. with_transaction
+# reruns the operation on write conflicts (TransientTransactionError) and
+# retries a commit whose outcome is unknown, so operation may run more than
+# once and must not have side effects outside the session.
+transactions_supported = True
+
+async def run_transaction(operation):
+    global transactions_supported
+    if transactions_supported:
+        try:
+            async with await client.start_session() as session:
+                return await session.with_transaction(operation)
+        except OperationFailure as e:
+            if e.code != 20:  # IllegalOperation
+                raise
+            transactions_supported = False
+            logger.warning("MongoDB does not support transactions here; writing without them")
+    return await operation(None)
+
+# Locks
+# Cross-process mutual exclusion for maintenance runs such as the rebuilds. A
+# lock is a document in `locks` that expires; its holder renews it while
+# running, so one left behind by a crashed process frees itself.
+LOCK_TTL = timedelta(seconds=60)
+
+@asynccontextmanager
+async def mongo_lock(name: str, busy_detail: str):
+    owner = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    try:
+        # Matches only an expired lock; a live one makes the upsert collide on _id
+        await db.locks.update_one(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + LOCK_TTL}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=busy_detail)
+
+    async def renew():
+        while True:
+            await asyncio.sleep(LOCK_TTL.total_seconds() / 3)
+            await db.locks.update_one(
+                {"_id": name, "owner": owner},
+                {"$set": {"expires_at": datetime.now(timezone.utc) + LOCK_TTL}},
+            )
+
+    renewal = asyncio.create_task(renew())
+    try:
+        yield
+    finally:
+        renewal.cancel()
+        await db.locks.delete_one({"_id": name, "owner": owner})
+
+# Indexes
+# collection -> [(keys, options)]
+INDEXES = {
+    "users": [
+        ([("id", 1)], {"unique": True}),
+        ([("email", 1)], {"unique": True}),
+    ],
+    "suppliers": [
+        ([("id", 1)], {"unique": True}),
+        # Supplier imports upsert on tax_id
+        ([("tax_id", 1)], {"unique": True, "partialFilterExpression": {"tax_id": {"$type": "string"}}}),
+        ([("search_keys", 1)], {}),
+        ([("name", "text"), ("tax_id", "text")], {"weights": {"tax_id": 10, "name": 5}}),
+        (KEYSET_SORT, {}),
+    ],
+    "items": [
+        ([("id", 1)], {"unique": True}),
+        ([("sku", 1)], {"unique": True}),
+        ([("supplier_id", 1)], {}),
+        ([("is_low_stock", 1), ("shortfall", -1)], {"partialFilterExpression": {"is_low_stock": True}}),
+        ([("search_keys", 1)], {}),
+        ([("name", "text"), ("sku", "text"), ("category", "text")],
+         {"weights": {"sku": 10, "name": 5, "category": 1}}),
+        (KEYSET_SORT, {}),
+    ],
+    "purchase_requisitions": [
+        ([("id", 1)], {"unique": True}),
+        ([("status", 1), ("created_at", 1)], {}),
+        (KEYSET_SORT, {}),
+    ],
+    "purchase_orders": [
+        ([("id", 1)], {"unique": True}),
+        ([("status", 1), ("created_at", 1)], {}),
+        ([("supplier_id", 1)], {}),
+        ([("updated_at", 1)], {}),
+        (KEYSET_SORT, {}),
+    ],
+    "goods_receipts": [
+        ([("id", 1)], {"unique": True}),
+        ([("po_id", 1)], {}),
+        (KEYSET_SORT, {}),
+    ],
+    "invoices": [
+        ([("id", 1)], {"unique": True}),
+        ([("po_id", 1)], {}),
+        ([("supplier_id", 1)], {}),
+        (KEYSET_SORT, {}),
+    ],
+    "spend_rollups": [
+        ([("month", 1)], {}),
+        ([("supplier_id", 1), ("month", 1)], {}),
+        ([("category", 1), ("month", 1)], {}),
+    ],
+    "jobs": [
+        ([("id", 1)], {"unique": True}),
+        ([("status", 1), ("priority", -1), ("created_at", 1)], {}),
+        ([("finished_at", 1)], {}),
+        ([("created_at", -1)], {}),
+    ],
+    "match_exceptions": [
+        ([("po_id", 1)], {}),
+        ([("types", 1), ("detected_at", -1)], {}),
+    ],
+}
+for _collection, _field, _ in SEQUENCES.values():
+    INDEXES[_collection].append(([(_field, 1)], {"unique": True}))
+
+# IndexOptionsConflict, IndexKeySpecsConflict
+INDEX_CONFLICT_CODES = (85, 86)
+
+async def has_unique_index(collection, field: str) -> bool:
+    indexes = await collection.index_information()
+    return any(index['key'] == [(field, 1)] and index.get('unique') for index in indexes.values())
+
+async def renumber_duplicates(database) -> List[dict]:
+    # Numbers issued before the counters (or copied in by hand) can repeat,
+    # which blocks the unique number indexes. The oldest document keeps the
+    # number; the others get fresh ones and keep the old in renumbered_from.
+    # Only runs while an index is missing, since it scans the collection.
+    counters = SequenceCounter(database)
+    seeded = False
+    renumbered = []
+    for name, (collection, field, _) in SEQUENCES.items():
+        if await has_unique_index(database[collection], field):
+            continue
+        pipeline = [
+            {"$match": {field: {"$type": "string"}}},
+            {"$sort": {"created_at": 1, "_id": 1}},
+            {"$group": {"_id": f"${field}", "docs": {"$push": {"_id": "$_id", "id": "$id"}}}},
+            {"$match": {"docs.1": {"$exists": True}}},
+        ]
+        duplicates = [
+            (group['_id'], doc)
+            async for group in database[collection].aggregate(pipeline, allowDiskUse=True)
+            for doc in group['docs'][1:]
+        ]
+        if not duplicates:
+            continue
+        if not seeded:
+            # Fresh numbers must come after every number already issued
+            await counters.backfill()
+            seeded = True
+        numbers = await counters.next_numbers(name, len(duplicates))
+        await database[collection].bulk_write([
+            UpdateOne({"_id": doc['_id']}, {"$set": {field: number, "renumbered_from": old}})
+            for (old, doc), number in zip(duplicates, numbers)
+        ], ordered=False)
+        if name == "po":
+            # Receipts carry a copy of their PO's number
+            await database.goods_receipts.bulk_write([
+                UpdateMany({"po_id": doc['id']}, {"$set": {"po_number": number}})
+                for (_, doc), number in zip(duplicates, numbers)
+            ], ordered=False)
+        for (old, doc), number in zip(duplicates, numbers):
+            logger.warning("Renumbered duplicate %s %s on %s to %s", field, old, doc['id'], number)
+            renumbered.append({"collection": collection, "id": doc['id'], "number": number, "renumbered_from": old})
+    return renumbered
+
+async def ensure_indexes(database) -> List[str]:
+    created = []
+    for collection, specs in INDEXES.items():
+        for keys, options in specs:
+            try:
+                try:
+                    created.append(await database[collection].create_index(keys, **options))
+                except OperationFailure as e:
+                    if e.code not in INDEX_CONFLICT_CODES:
+                        raise
+                    # Same keys, older options: replace it
+                    await database[collection].drop_index(keys)
+                    created.append(await database[collection].create_index(keys, **options))
+            except OperationFailure as e:
+                # Typically duplicate data blocking a unique index; keep serving
+                logger.error("Could not create index %s on %s: %s", keys, collection, e)
+    return created
+
+# Date fields stored as native BSON dates, per collection
+DATE_FIELDS = {
+    "users": ["created_at"],
+    "suppliers": ["created_at"],
+    "items": ["created_at"],
+    "purchase_requisitions": ["created_at", "updated_at", "required_by"],
+    "purchase_orders": ["created_at", "updated_at", "delivery_date"],
+    "goods_receipts": ["created_at", "received_date"],
+    "invoices": ["created_at", "due_date", "paid_date"],
+}
+DATE_MIGRATION_ID = "native_dates"
+
+async def migrate_native_dates(database, batch_size: int = 500) -> dict:
+    # Converts ISO-string dates left by older releases in place. Progress is
+    # checkpointed by _id in the migrations collection, so a re-run resumes.
+    state = await database.migrations.find_one({"_id": DATE_MIGRATION_ID}) or {}
+    checkpoints = state.get('checkpoints', {})
+    converted = {}
+    for collection, fields in DATE_FIELDS.items():
+        query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        if collection in checkpoints:
+            query["_id"] = {"$gt": checkpoints[collection]}
+        converted[collection] = 0
+        while True:
+            batch = await database[collection].find(query, {field: 1 for field in fields}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            ops = []
+            for doc in batch:
+                updates = {}
+                for field in fields:
+                    value = doc.get(field)
+                    if isinstance(value, str):
+                        try:
+                            updates[field] = datetime.fromisoformat(value)
+                        except ValueError:
+                            logger.warning("Unparseable %s.%s on %s: %r", collection, field, doc['_id'], value)
+                if updates:
+                    ops.append(UpdateOne({"_id": doc['_id']}, {"$set": updates}))
+            if ops:
+                await database[collection].bulk_write(ops, ordered=False)
+            converted[collection] += len(ops)
+            query["_id"] = {"$gt": batch[-1]['_id']}
+            await database.migrations.update_one(
+                {"_id": DATE_MIGRATION_ID},
+                {"$set": {f"checkpoints.{collection}": batch[-1]['_id']}},
+                upsert=True,
+            )
+    await database.migrations.update_one(
+        {"_id": DATE_MIGRATION_ID},
+        {"$set": {"checkpoints": {}, "completed_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    return converted
+
+# Query shapes issued by the routes, audited by /admin/query-plans.
+# (route, collection, command) where command is a find or count body.
+QUERY_SHAPES = [
+    ("login", "users", {"find": "users", "filter": {"email": ""}}),
+    ("get_suppliers", "suppliers", {"find": "suppliers", "filter": {}, "sort": dict(KEYSET_SORT)}),
+    ("get_supplier", "suppliers", {"find": "suppliers", "filter": {"id": ""}}),
+    ("get_items", "items", {"find": "items", "filter": {}, "sort": dict(KEYSET_SORT)}),
+    ("get_item", "items", {"find": "items", "filter": {"id": ""}}),
+    ("search_items", "items", {"find": "items", "filter": {"search_keys": {"$regex": "^a"}}}),
+    ("search_suppliers", "suppliers", {"find": "suppliers", "filter": {"search_keys": {"$regex": "^a"}}}),
+    ("get_low_stock_items", "items", {"find": "items", "filter": {"is_low_stock": True}, "sort": {"shortfall": -1}}),
+    ("get_prs", "purchase_requisitions", {"find": "purchase_requisitions", "filter": {}, "sort": dict(KEYSET_SORT)}),
+    ("approve_pr", "purchase_requisitions", {"find": "purchase_requisitions", "filter": {"id": ""}}),
+    ("get_pos", "purchase_orders", {"find": "purchase_orders", "filter": {}, "sort": dict(KEYSET_SORT)}),
+    ("get_po", "purchase_orders", {"find": "purchase_orders", "filter": {"id": ""}}),
+    ("get_grs", "goods_receipts", {"find": "goods_receipts", "filter": {}, "sort": dict(KEYSET_SORT)}),
+    ("get_invoices", "invoices", {"find": "invoices", "filter": {}, "sort": dict(KEYSET_SORT)}),
+    ("get_dashboard_stats", "purchase_orders", {"count": "purchase_orders", "query": {"status": "pending"}}),
+]
+
+def plan_stages(plan) -> List[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+async def audit_query_plans(database) -> List[dict]:
+    report = []
+    for route, collection, command in QUERY_SHAPES:
+        explained = await database.command({"explain": command, "verbosity": "queryPlanner"})
+        stages = plan_stages(explained.get('queryPlanner', {}).get('winningPlan', {}))
+        report.append({
+            "route": route,
+            "collection": collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
+
+async def warm_queries(database, docs: int):
+    # Runs each query shape once so the first requests find the plans cached
+    # and the leading index pages in memory
+    for route, collection, command in QUERY_SHAPES:
+        if "find" in command:
+            command = {**command, "limit": docs, "singleBatch": True}
+        await database.command(command)
+
 # PDF Generator
 class PDFGenerator:
     @staticmethod
@@ -277,23 +1508,441 @@ class PDFGenerator:
         output.seek(0)
         return output
 
+# PDF rendering
+# Supplier fields printed on the PO; a change to any of them changes the cache key
+SUPPLIER_PDF_FIELDS = ("name", "address", "email", "phone")
+
+def render_po_pdf(po_doc: dict, supplier_doc: dict) -> bytes:
+    # Runs in a worker process, so it takes and returns plain picklable data
+    return PDFGenerator.generate_po_pdf(PurchaseOrder(**po_doc), Supplier(**supplier_doc)).getvalue()
+
+def pdf_cache_key(po_doc: dict, supplier_doc: dict) -> str:
+    supplier_version = json.dumps([supplier_doc.get(f) for f in SUPPLIER_PDF_FIELDS], default=json_default)
+    updated_at = po_doc.get('updated_at')
+    if isinstance(updated_at, datetime):
+        updated_at = updated_at.isoformat()
+    raw = f"{po_doc['id']}:{updated_at}:{supplier_version}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or etag in [t[2:] if t.startswith('W/') else t for t in tags]
+
+class PDFRenderer:
+    # Renders in a process pool behind an LRU memory tier and an optional disk
+    # tier. The disk tier is an LRU too: reads refresh a file's mtime and the
+    # oldest files are deleted once it outgrows cache_dir_bytes. Workers sharing
+    # the directory each count only their own writes between scans, so it can
+    # briefly overshoot by that much per worker.
+    def __init__(self, workers: int, cache_size: int, cache_dir: Optional[str] = None, cache_dir_bytes: int = 0):
+        self.workers = max(1, workers)
+        self.cache = TTLCache(ttl=float('inf'), maxsize=cache_size)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.cache_dir_bytes = cache_dir_bytes
+        # None until the first scan of cache_dir
+        self._disk_bytes = None
+        self._disk_lock = threading.Lock()
+        self._executor = None
+        self._inflight = {}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def render(self, key: str, po_doc: dict, supplier_doc: dict) -> bytes:
+        pdf = self.cache.get(key)
+        if pdf is not None:
+            return pdf
+        # Concurrent requests for the same PDF share one render
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, po_doc, supplier_doc))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, po_doc: dict, supplier_doc: dict) -> bytes:
+        pdf = await asyncio.to_thread(self._read_disk, key)
+        if pdf is None:
+            loop = asyncio.get_running_loop()
+            pdf = await loop.run_in_executor(self.executor, render_po_pdf, po_doc, supplier_doc)
+            await asyncio.to_thread(self._write_disk, key, pdf)
+        self.cache.set(key, pdf)
+        return pdf
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{key}.pdf"
+        try:
+            pdf = path.read_bytes()
+            os.utime(path)
+            return pdf
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, pdf: bytes):
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_dir / f"{key}.{os.getpid()}.tmp"
+        tmp.write_bytes(pdf)
+        os.replace(tmp, self.cache_dir / f"{key}.pdf")
+        with self._disk_lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(pdf)
+            if self._disk_bytes is None or self._disk_bytes > self.cache_dir_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Deletes least recently used files down to 90% of the limit
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pdf'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        if total > self.cache_dir_bytes:
+            target = self.cache_dir_bytes * 0.9
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._disk_bytes = total
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+pdf_renderer = PDFRenderer(
+    workers=int(os.environ.get('PDF_WORKERS', str(os.cpu_count() or 1))),
+    cache_size=int(os.environ.get('PDF_CACHE_SIZE', '256')),
+    cache_dir=os.environ.get('PDF_CACHE_DIR'),
+    cache_dir_bytes=int(os.environ.get('PDF_CACHE_DIR_BYTES', str(512 * 1024 * 1024))),
+)
+
+# Streamed files
+# A generated download: returned inline as a streaming response, or written to
+# GridFS when produced by a background job
+class StreamedFile(NamedTuple):
+    filename: str
+    media_type: str
+    chunks: Any  # async iterator of bytes
+
+def file_response(output: StreamedFile) -> StreamingResponse:
+    return StreamingResponse(
+        output.chunks,
+        media_type=output.media_type,
+        headers={"Content-Disposition": f"attachment; filename={output.filename}"},
+    )
+
+# Streamed ZIP archives
+class ZipStream:
+    # Write-only sink for zipfile. It has no tell(), so zipfile treats it as
+    # unseekable and writes data descriptors; each entry can be drained and
+    # sent as soon as it is written.
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+PDF_EXPORT_CONCURRENCY = int(os.environ.get('PDF_EXPORT_CONCURRENCY', str(pdf_renderer.workers * 2)))
+
+async def stream_po_pdf_zip(po_docs: List[dict], suppliers: dict):
+    sink = ZipStream()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED)
+    errors = []
+
+    async def render(po_doc):
+        supplier_doc = suppliers.get(po_doc['supplier_id'])
+        if supplier_doc is None:
+            raise LookupError("Supplier not found")
+        return await pdf_renderer.render(pdf_cache_key(po_doc, supplier_doc), po_doc, supplier_doc)
+
+    # Keep a bounded number of renders in flight and write entries in completion order
+    remaining = iter(po_docs)
+    pending = {}
+    try:
+        while True:
+            while len(pending) < PDF_EXPORT_CONCURRENCY:
+                po_doc = next(remaining, None)
+                if po_doc is None:
+                    break
+                pending[asyncio.ensure_future(render(po_doc))] = po_doc
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                po_doc = pending.pop(task)
+                try:
+                    archive.writestr(f"PO_{po_doc['po_number']}.pdf", task.result())
+                except Exception as e:
+                    errors.append(f"{po_doc['po_number']}: {e}")
+                yield sink.drain()
+    finally:
+        # Client went away mid-stream
+        for task in pending:
+            task.cancel()
+
+    if errors:
+        archive.writestr("errors.txt", "\n".join(errors) + "\n")
+    archive.close()
+    yield sink.drain()
+
+# Authentication
+# bcrypt releases the GIL, so hashing runs on its own thread pool and never
+# blocks the event loop. Tokens are signed JWTs; a verified token is cached
+# with its user until it expires, so authenticated requests skip db.users.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+AUTH_HASH_WORKERS = int(os.environ.get('AUTH_HASH_WORKERS', str(os.cpu_count() or 1)))
+# Without a configured secret, tokens only verify in the process that issued them
+JWT_SECRET = os.environ.get('JWT_SECRET') or secrets.token_urlsafe(32)
+JWT_ALGORITHM = "HS256"
+TOKEN_TTL = timedelta(hours=float(os.environ.get('TOKEN_TTL_HOURS', '12')))
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '10000'))
+# Enforce a valid token on every route except these
+AUTH_REQUIRED = os.environ.get('AUTH_REQUIRED', 'false').lower() == 'true'
+AUTH_PUBLIC_PATHS = {"/api/auth/register", "/api/auth/login", "/api/metrics", "/api/health/live", "/api/health/ready"}
+USER_PROJECTION = {"_id": 0, "password": 0, "password_hash": 0}
+
+auth_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
+session_cache = TTLCache(ttl=TOKEN_TTL.total_seconds(), maxsize=SESSION_CACHE_SIZE)
+bearer_scheme = HTTPBearer(auto_error=False)
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    hashed = await loop.run_in_executor(
+        auth_executor, lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS))
+    )
+    return hashed.decode()
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(auth_executor, bcrypt.checkpw, password.encode(), password_hash.encode())
+
+# Checked for unknown emails so they cost the same as a wrong password.
+# Hashed on the auth pool once, during startup.
+dummy_hash: Optional[str] = None
+
+async def dummy_password_hash() -> str:
+    global dummy_hash
+    if dummy_hash is None:
+        dummy_hash = await hash_password(secrets.token_urlsafe(16))
+    return dummy_hash
+
+def issue_token(user: dict) -> str:
+    now = datetime.now(timezone.utc)
+    expires = now + TOKEN_TTL
+    token = jwt.encode({"sub": user['id'], "iat": now, "exp": expires}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    session_cache.set(token, (expires.timestamp(), user))
+    return token
+
+def unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+async def current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)) -> dict:
+    if credentials is None:
+        raise unauthorized("Not authenticated")
+    token = credentials.credentials
+    cached = session_cache.get(token)
+    if cached is not None and cached[0] > time.time():
+        metrics.observe_cache("sessions", 1, 0, len(session_cache))
+        return cached[1]
+    metrics.observe_cache("sessions", 0, 1, len(session_cache))
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        session_cache.invalidate(token)
+        raise unauthorized("Invalid or expired token")
+    user = await db.users.find_one({"id": claims['sub']}, USER_PROJECTION)
+    if not user:
+        raise unauthorized("Invalid or expired token")
+    session_cache.set(token, (claims['exp'], user))
+    return user
+
+async def enforce_auth(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)):
+    if AUTH_REQUIRED and request.url.path not in AUTH_PUBLIC_PATHS:
+        await current_user(credentials)
+
 # Auth Routes
 @api_router.post("/auth/register", response_model=User)
 async def register(user: UserCreate):
-    user_dict = user.model_dump()
-    user_obj = User(**user_dict)
-    doc = user_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.users.insert_one(doc)
+    user_obj = User(**user.model_dump(exclude={"password"}))
+    doc = {**user_obj.model_dump(), "password_hash": await hash_password(user.password)}
+    try:
+        await db.users.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     return user_obj
 
 @api_router.post("/auth/login")
 async def login(credentials: LoginRequest):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or user['password'] != credentials.password:
+    if not user:
+        await verify_password(credentials.password, await dummy_password_hash())
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    user['created_at'] = datetime.fromisoformat(user['created_at'])
-    return {"user": user, "token": f"token_{user['id']}"}
+    if 'password_hash' in user:
+        valid = await verify_password(credentials.password, user['password_hash'])
+    else:
+        # Accounts registered before hashing; upgraded on their first login.
+        # One with no stored password at all can't log in.
+        stored = user.get('password') or ''
+        valid = bool(stored) and hmac.compare_digest(stored.encode(), credentials.password.encode())
+        if valid:
+            await db.users.update_one(
+                {"id": user['id']},
+                {"$set": {"password_hash": await hash_password(credentials.password)}, "$unset": {"password": ""}},
+            )
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    user = {k: v for k, v in user.items() if k not in USER_PROJECTION}
+    return {"user": user, "token": issue_token(user)}
+
+@api_router.get("/auth/me", response_model=User)
+async def get_me(user: dict = Depends(current_user)):
+    return user
+
+# Background execution
+# Heavy routes take ?background=true to run as a job; see Background jobs
+def run_in_background(
+    background: bool = Query(False, description="Run as a background job; responds 202 with the job"),
+) -> bool:
+    return background
+
+# Bulk import
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '1000'))
+IMPORT_MAX_ERRORS = 1000
+
+class ImportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportResult(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
+    rows_per_second: float = 0
+
+    def add_error(self, row: int, error: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(ImportRowError(row=row, error=error))
+
+def detect_import_format(upload: UploadFile) -> ImportFormat:
+    name = (upload.filename or '').lower()
+    if name.endswith('.csv') or upload.content_type in ('text/csv', 'application/csv'):
+        return ImportFormat.CSV
+    return ImportFormat.NDJSON
+
+def iter_import_rows(upload: UploadFile, fmt: ImportFormat):
+    # Yields (row number, parsed row or parse error) without reading the whole upload
+    text = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    if fmt == ImportFormat.CSV:
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            yield row_number, {k: v for k, v in row.items() if k and v not in ('', None)}
+    else:
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line)
+            except ValueError as e:
+                yield row_number, e
+
+def upsert_op(key: str, create_obj: BaseModel, model, extra: Optional[dict] = None, stages: tuple = ()):
+    # Sets only the columns the row supplied. Every other default (id,
+    # created_at, quantity, ...) only fills a field the stored document lacks,
+    # so a re-import with fewer columns keeps what is already there. stages
+    # run after, against the merged document.
+    fields = {**create_obj.model_dump(exclude_unset=True), **(extra or {})}
+    defaults = {
+        k: v for k, v in model(**{**create_obj.model_dump(), **(extra or {})}).model_dump().items()
+        if k not in fields
+    }
+    return UpdateOne({key: fields[key]}, [
+        {"$set": {
+            **{k: {"$ifNull": [f"${k}", {"$literal": v}]} for k, v in defaults.items()},
+            **{k: {"$literal": v} for k, v in fields.items()},
+        }},
+        *stages,
+    ], upsert=True)
+
+def item_import_op(item: ItemCreate):
+    return upsert_op("sku", item, Item, search_fields(SearchKind.ITEMS, item.model_dump()), (STOCK_STATUS_STAGE,))
+
+def supplier_import_op(supplier: SupplierCreate):
+    extra = search_fields(SearchKind.SUPPLIERS, supplier.model_dump())
+    if not supplier.tax_id:
+        return InsertOne({**Supplier(**supplier.model_dump()).model_dump(), **extra})
+    return upsert_op("tax_id", supplier, Supplier, extra)
+
+def next_import_batch(rows, model, build_op, result: ImportResult):
+    # Returns (ops, row numbers of ops, whether the upload is exhausted)
+    ops, op_rows = [], []
+    for row_number, row in rows:
+        result.received += 1
+        if isinstance(row, Exception):
+            result.add_error(row_number, f"Invalid JSON: {row}")
+        else:
+            try:
+                ops.append(build_op(model.model_validate(row)))
+                op_rows.append(row_number)
+            except ValidationError as e:
+                err = e.errors()[0]
+                result.add_error(row_number, f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}")
+        if result.received % IMPORT_BATCH_SIZE == 0:
+            return ops, op_rows, False
+    return ops, op_rows, True
+
+async def import_rows(collection, upload: UploadFile, fmt: Optional[ImportFormat], model, build_op) -> ImportResult:
+    started = time.perf_counter()
+    result = ImportResult()
+    rows = iter_import_rows(upload, fmt or detect_import_format(upload))
+    exhausted = False
+    while not exhausted:
+        # Parsing and validation are CPU-bound; keep them off the event loop
+        ops, op_rows, exhausted = await asyncio.to_thread(next_import_batch, rows, model, build_op, result)
+        if not ops:
+            continue
+        try:
+            details = (await collection.bulk_write(ops, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for err in details.get('writeErrors', []):
+                result.add_error(op_rows[err['index']], err.get('errmsg', 'Write failed'))
+        result.inserted += details.get('nInserted', 0) + details.get('nUpserted', 0)
+        result.updated += details.get('nMatched', 0)
+    elapsed = time.perf_counter() - started
+    result.rows_per_second = round(result.received / elapsed, 1) if elapsed else 0
+    return result
 
 # Supplier Routes
 @api_router.post("/suppliers", response_model=Supplier)
@@ -301,106 +1950,163 @@ async def create_supplier(supplier: SupplierCreate):
     supplier_dict = supplier.model_dump()
     supplier_obj = Supplier(**supplier_dict)
     doc = supplier_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.suppliers.insert_one(doc)
+    try:
+        await db.suppliers.insert_one({**doc, **search_fields(SearchKind.SUPPLIERS, doc)})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="A supplier with this tax ID already exists")
+    search_index.put(SearchKind.SUPPLIERS, doc)
+    await lookup_cache.invalidate("suppliers", [doc['id']])
+    invalidate_dashboard()
     return supplier_obj
 
+async def run_supplier_import(file: UploadFile, format: Optional[ImportFormat]) -> ImportResult:
+    result = await import_rows(db.suppliers, file, format, SupplierCreate, supplier_import_op)
+    await search_index.load(db, SearchKind.SUPPLIERS)
+    await lookup_cache.invalidate("suppliers")
+    invalidate_dashboard()
+    return result
+
+@api_router.post("/suppliers/import", response_model=ImportResult)
+async def import_suppliers(
+    file: UploadFile = File(...),
+    format: Optional[ImportFormat] = Query(None),
+    background: bool = Depends(run_in_background),
+):
+    if background:
+        return await enqueue_upload_job(JobType.SUPPLIER_IMPORT, file, format)
+    return await run_supplier_import(file, format)
+
 @api_router.get("/suppliers", response_model=List[Supplier])
-async def get_suppliers():
-    suppliers = await db.suppliers.find({}, {"_id": 0}).to_list(1000)
-    for s in suppliers:
-        s['created_at'] = datetime.fromisoformat(s['created_at'])
-    return suppliers
+async def get_suppliers(response: Response, params: ListParams = Depends()):
+    return await list_documents(db.suppliers, Supplier, params, response)
 
 @api_router.get("/suppliers/{supplier_id}", response_model=Supplier)
 async def get_supplier(supplier_id: str):
-    supplier = await db.suppliers.find_one({"id": supplier_id}, {"_id": 0})
+    supplier = await lookup_cache.get("suppliers", supplier_id)
     if not supplier:
         raise HTTPException(status_code=404, detail="Supplier not found")
-    supplier['created_at'] = datetime.fromisoformat(supplier['created_at'])
     return supplier
 
 @api_router.put("/suppliers/{supplier_id}", response_model=Supplier)
 async def update_supplier(supplier_id: str, supplier: SupplierCreate):
-    result = await db.suppliers.update_one({"id": supplier_id}, {"$set": supplier.model_dump()})
+    update = supplier.model_dump()
+    try:
+        result = await db.suppliers.update_one({"id": supplier_id}, {"$set": {**update, **search_fields(SearchKind.SUPPLIERS, update)}})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="A supplier with this tax ID already exists")
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Supplier not found")
+    search_index.put(SearchKind.SUPPLIERS, {"id": supplier_id, **update})
+    await lookup_cache.invalidate("suppliers", [supplier_id])
     updated = await db.suppliers.find_one({"id": supplier_id}, {"_id": 0})
-    updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     return updated
 
 # Items/Inventory Routes
 @api_router.post("/items", response_model=Item)
 async def create_item(item: ItemCreate):
     item_dict = item.model_dump()
-    item_obj = Item(**item_dict)
+    item_obj = Item(**item_dict, **stock_status(item.quantity, item.reorder_level))
     doc = item_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.items.insert_one(doc)
+    await db.items.insert_one({**doc, **search_fields(SearchKind.ITEMS, doc)})
+    search_index.put(SearchKind.ITEMS, doc)
+    await lookup_cache.invalidate("items", [doc['id']])
+    invalidate_dashboard()
     return item_obj
 
+async def run_item_import(file: UploadFile, format: Optional[ImportFormat]) -> ImportResult:
+    result = await import_rows(db.items, file, format, ItemCreate, item_import_op)
+    await search_index.load(db, SearchKind.ITEMS)
+    await lookup_cache.invalidate("items")
+    invalidate_dashboard()
+    return result
+
+@api_router.post("/items/import", response_model=ImportResult)
+async def import_items(
+    file: UploadFile = File(...),
+    format: Optional[ImportFormat] = Query(None),
+    background: bool = Depends(run_in_background),
+):
+    if background:
+        return await enqueue_upload_job(JobType.ITEM_IMPORT, file, format)
+    return await run_item_import(file, format)
+
 @api_router.get("/items", response_model=List[Item])
-async def get_items():
-    items = await db.items.find({}, {"_id": 0}).to_list(1000)
-    for i in items:
-        i['created_at'] = datetime.fromisoformat(i['created_at'])
-    return items
+async def get_items(response: Response, params: ListParams = Depends()):
+    return await list_documents(db.items, Item, params, response)
 
 @api_router.get("/items/low-stock", response_model=List[Item])
-async def get_low_stock_items():
-    items = await db.items.find({"_id": 0}).to_list(1000)
-    low_stock = [i for i in items if i.get('quantity', 0) <= i.get('reorder_level', 0)]
-    for i in low_stock:
-        i['created_at'] = datetime.fromisoformat(i['created_at'])
-    return low_stock
+async def get_low_stock_items(
+    sort: LowStockSort = Query(LowStockSort.SHORTFALL),
+    category: Optional[str] = Query(None),
+    supplier_id: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    query = {"is_low_stock": True}
+    if category:
+        query["category"] = category
+    if supplier_id:
+        query["supplier_id"] = supplier_id
+    order = [("shortfall", -1), ("id", 1)] if sort == LowStockSort.SHORTFALL else [("name", 1)]
+    return await db.items.find(query, {"_id": 0}).sort(order).limit(limit).to_list(limit)
 
 @api_router.get("/items/{item_id}", response_model=Item)
 async def get_item(item_id: str):
-    item = await db.items.find_one({"id": item_id}, {"_id": 0})
+    item = await lookup_cache.get("items", item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    item['created_at'] = datetime.fromisoformat(item['created_at'])
     return item
 
 @api_router.put("/items/{item_id}", response_model=Item)
 async def update_item(item_id: str, item: ItemCreate):
-    result = await db.items.update_one({"id": item_id}, {"$set": item.model_dump()})
+    update = {**item.model_dump(), **stock_status(item.quantity, item.reorder_level)}
+    result = await db.items.update_one({"id": item_id}, {"$set": {**update, **search_fields(SearchKind.ITEMS, update)}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Item not found")
+    search_index.put(SearchKind.ITEMS, {"id": item_id, **update})
+    await lookup_cache.invalidate("items", [item_id])
+    invalidate_dashboard()
     updated = await db.items.find_one({"id": item_id}, {"_id": 0})
-    updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     return updated
 
+# Search Routes
+@api_router.get("/search", response_model=List[SearchHit])
+async def search(
+    q: str = Query(..., min_length=1),
+    kind: SearchKind = Query(...),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+):
+    return await search_documents(kind, normalize_search(q), limit, offset)
+
+@api_router.get("/search/typeahead", response_model=List[SearchHit])
+async def typeahead(
+    q: str = Query(..., min_length=1),
+    kind: Optional[SearchKind] = Query(None),
+    limit: int = Query(10, ge=1, le=50),
+):
+    kinds = [kind] if kind else list(SearchKind)
+    return search_index.search(normalize_search(q), kinds, limit)
+
 # Purchase Requisition Routes
 @api_router.post("/purchase-requisitions", response_model=PurchaseRequisition)
 async def create_pr(pr: PRCreate):
-    count = await db.purchase_requisitions.count_documents({})
     pr_dict = pr.model_dump()
     total = sum(item.total for item in pr.items)
-    pr_obj = PurchaseRequisition(**pr_dict, pr_number=f"PR-{count+1:05d}", total_amount=total)
+    pr_number = await sequences.next_number("pr")
+    pr_obj = PurchaseRequisition(**pr_dict, pr_number=pr_number, total_amount=total)
     doc = pr_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    if doc.get('required_by'):
-        doc['required_by'] = doc['required_by'].isoformat()
     await db.purchase_requisitions.insert_one(doc)
     return pr_obj
 
 @api_router.get("/purchase-requisitions", response_model=List[PurchaseRequisition])
-async def get_prs():
-    prs = await db.purchase_requisitions.find({}, {"_id": 0}).to_list(1000)
-    for pr in prs:
-        pr['created_at'] = datetime.fromisoformat(pr['created_at'])
-        pr['updated_at'] = datetime.fromisoformat(pr['updated_at'])
-        if pr.get('required_by'):
-            pr['required_by'] = datetime.fromisoformat(pr['required_by'])
-    return prs
+async def get_prs(response: Response, params: ListParams = Depends()):
+    return await list_documents(db.purchase_requisitions, PurchaseRequisition, params, response)
 
 @api_router.put("/purchase-requisitions/{pr_id}/approve")
 async def approve_pr(pr_id: str):
     result = await db.purchase_requisitions.update_one(
         {"id": pr_id},
-        {"$set": {"status": PRStatus.APPROVED.value, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"status": PRStatus.APPROVED.value, "updated_at": datetime.now(timezone.utc)}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="PR not found")
@@ -409,180 +2115,1691 @@ async def approve_pr(pr_id: str):
 # Purchase Order Routes
 @api_router.post("/purchase-orders", response_model=PurchaseOrder)
 async def create_po(po: POCreate):
-    count = await db.purchase_orders.count_documents({})
     po_dict = po.model_dump()
     total = sum(item.total for item in po.items)
-    po_obj = PurchaseOrder(**po_dict, po_number=f"PO-{count+1:05d}", total_amount=total)
+    po_number = await sequences.next_number("po")
+    po_obj = PurchaseOrder(**po_dict, po_number=po_number, total_amount=total)
     doc = po_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    if doc.get('delivery_date'):
-        doc['delivery_date'] = doc['delivery_date'].isoformat()
     await db.purchase_orders.insert_one(doc)
+    await record_spend(doc, doc['created_at'], "ordered")
+    invalidate_dashboard()
     return po_obj
 
 @api_router.get("/purchase-orders", response_model=List[PurchaseOrder])
-async def get_pos():
-    pos = await db.purchase_orders.find({}, {"_id": 0}).to_list(1000)
-    for po in pos:
-        po['created_at'] = datetime.fromisoformat(po['created_at'])
-        po['updated_at'] = datetime.fromisoformat(po['updated_at'])
-        if po.get('delivery_date'):
-            po['delivery_date'] = datetime.fromisoformat(po['delivery_date'])
-    return pos
+async def get_pos(response: Response, params: ListParams = Depends()):
+    return await list_documents(db.purchase_orders, PurchaseOrder, params, response)
 
 @api_router.get("/purchase-orders/{po_id}", response_model=PurchaseOrder)
 async def get_po(po_id: str):
-    po = await db.purchase_orders.find_one({"id": po_id}, {"_id": 0})
+    po = await lookup_cache.get("purchase_orders", po_id)
     if not po:
         raise HTTPException(status_code=404, detail="PO not found")
-    po['created_at'] = datetime.fromisoformat(po['created_at'])
-    po['updated_at'] = datetime.fromisoformat(po['updated_at'])
-    if po.get('delivery_date'):
-        po['delivery_date'] = datetime.fromisoformat(po['delivery_date'])
     return po
 
+# Auto-approve if > $10k needs 2 levels, else 1
+TWO_LEVEL_APPROVAL_THRESHOLD = 10000
+# Only these take approvals; approved, completed and rejected POs are settled
+APPROVABLE_STATUSES = [ApprovalStatus.DRAFT.value, ApprovalStatus.PENDING.value]
+# Fields needed after an approval to update the spend rollups
+APPROVAL_PROJECTION = {
+    "_id": 0, "id": 1, "status": 1, "approval_level": 1, "total_amount": 1,
+    "supplier_id": 1, "supplier_name": 1, "items": 1, "created_at": 1,
+}
+
+def became_approved(po: dict) -> bool:
+    # Each approval adds exactly one level, so the PO crossed into approved on
+    # the approval that brought it to the required level
+    required_levels = 2 if po['total_amount'] > TWO_LEVEL_APPROVAL_THRESHOLD else 1
+    return po['status'] == ApprovalStatus.APPROVED.value and po['approval_level'] == required_levels
+
+def approval_pipeline(approver_id: str) -> list:
+    # Evaluated by Mongo against the current document, so concurrent approvals
+    # can't overwrite each other. Callers filter out POs the approver already
+    # signed, which gives the $addToSet semantics.
+    return [
+        {"$set": {
+            "approved_by": {"$concatArrays": [{"$ifNull": ["$approved_by", []]}, [{"$literal": approver_id}]]},
+            "approval_level": {"$add": [{"$ifNull": ["$approval_level", 0]}, 1]},
+            "updated_at": datetime.now(timezone.utc),
+        }},
+        {"$set": {"status": {"$cond": [
+            {"$gte": ["$approval_level", {"$cond": [{"$gt": ["$total_amount", TWO_LEVEL_APPROVAL_THRESHOLD]}, 2, 1]}]},
+            ApprovalStatus.APPROVED.value,
+            ApprovalStatus.PENDING.value,
+        ]}}},
+    ]
+
+async def apply_approval(po_id: str, approver_id: str) -> Optional[dict]:
+    # The returned document is the one this approval produced, so only the
+    # approval that crossed the required level books the approved spend.
+    # None when the PO is missing, no longer awaiting approval, or the
+    # approver already signed it.
+    po = await db.purchase_orders.find_one_and_update(
+        {"id": po_id, "status": {"$in": APPROVABLE_STATUSES}, "approved_by": {"$ne": approver_id}},
+        approval_pipeline(approver_id),
+        projection=APPROVAL_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if po and became_approved(po):
+        await record_spend(po, po['created_at'], "approved")
+    return po
+
+def skipped_approval_result(po: Optional[dict], approver_id: str) -> str:
+    # Why apply_approval left a PO alone
+    if po is None:
+        return "not_found"
+    if approver_id in po.get('approved_by', []):
+        return "already_approved"
+    return "not_approvable"
+
 @api_router.put("/purchase-orders/{po_id}/approve")
 async def approve_po(po_id: str, approver_id: str = Query(...)):
-    po = await db.purchase_orders.find_one({"id": po_id}, {"_id": 0})
+    po = await apply_approval(po_id, approver_id)
     if not po:
-        raise HTTPException(status_code=404, detail="PO not found")
-    
-    approved_by = po.get('approved_by', [])
-    approved_by.append(approver_id)
-    new_level = po.get('approval_level', 0) + 1
-    
-    # Auto-approve if > $10k needs 2 levels, else 1
-    required_levels = 2 if po['total_amount'] > 10000 else 1
-    new_status = ApprovalStatus.APPROVED.value if new_level >= required_levels else ApprovalStatus.PENDING.value
-    
-    result = await db.purchase_orders.update_one(
-        {"id": po_id},
-        {"$set": {
-            "status": new_status,
-            "approval_level": new_level,
-            "approved_by": approved_by,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-    return {"message": "PO approved", "status": new_status}
+        po = await db.purchase_orders.find_one({"id": po_id}, {"_id": 0, "status": 1, "approved_by": 1})
+        result = skipped_approval_result(po, approver_id)
+        if result == "not_found":
+            raise HTTPException(status_code=404, detail="PO not found")
+        if result == "not_approvable":
+            raise HTTPException(status_code=409, detail=f"PO is {po['status']} and can't be approved")
+        return {"message": "PO already approved by this approver", "status": po['status']}
+    await lookup_cache.invalidate("purchase_orders", [po_id])
+    invalidate_dashboard()
+    return {"message": "PO approved", "status": po['status']}
+
+@api_router.post("/purchase-orders/approve", response_model=List[POApprovalResult])
+async def approve_pos(batch: POBatchApproval):
+    po_ids = list(dict.fromkeys(batch.po_ids))
+    approved = await asyncio.gather(*(apply_approval(po_id, batch.approver_id) for po_id in po_ids))
+    await lookup_cache.invalidate("purchase_orders", po_ids)
+    skipped = [po_id for po_id, po in zip(po_ids, approved) if po is None]
+    existing = {po['id']: po async for po in db.purchase_orders.find(
+        {"id": {"$in": skipped}}, {"_id": 0, "id": 1, "status": 1, "approved_by": 1}
+    )} if skipped else {}
+
+    results = []
+    for po_id, po in zip(po_ids, approved):
+        if po is not None:
+            results.append(POApprovalResult(po_id=po_id, result="approved", status=po['status']))
+        else:
+            po = existing.get(po_id)
+            results.append(POApprovalResult(
+                po_id=po_id, result=skipped_approval_result(po, batch.approver_id), status=po and po['status']
+            ))
+    invalidate_dashboard()
+    return results
+
+async def po_pdf_export_file(export: POPdfExportRequest) -> StreamedFile:
+    po_docs = await db.purchase_orders.find(export.query(), {"_id": 0}).sort(KEYSET_SORT).to_list(None)
+    supplier_ids = list({po['supplier_id'] for po in po_docs})
+    suppliers = {s['id']: s async for s in db.suppliers.find({"id": {"$in": supplier_ids}}, {"_id": 0})}
+    return StreamedFile("purchase_orders.zip", "application/zip", stream_po_pdf_zip(po_docs, suppliers))
+
+@api_router.post("/purchase-orders/pdf-export")
+async def export_po_pdfs(export: POPdfExportRequest, background: bool = Depends(run_in_background)):
+    if background:
+        return await enqueue_job(JobType.PO_PDF_EXPORT, export.model_dump())
+    return file_response(await po_pdf_export_file(export))
 
 @api_router.get("/purchase-orders/{po_id}/pdf")
-async def download_po_pdf(po_id: str):
-    po_doc = await db.purchase_orders.find_one({"id": po_id}, {"_id": 0})
+async def download_po_pdf(po_id: str, if_none_match: Optional[str] = Header(None)):
+    po_doc = await lookup_cache.get("purchase_orders", po_id)
     if not po_doc:
         raise HTTPException(status_code=404, detail="PO not found")
     
-    po_doc['created_at'] = datetime.fromisoformat(po_doc['created_at'])
-    po_doc['updated_at'] = datetime.fromisoformat(po_doc['updated_at'])
-    if po_doc.get('delivery_date'):
-        po_doc['delivery_date'] = datetime.fromisoformat(po_doc['delivery_date'])
-    po = PurchaseOrder(**po_doc)
-    
-    supplier_doc = await db.suppliers.find_one({"id": po.supplier_id}, {"_id": 0})
+    supplier_doc = await lookup_cache.get("suppliers", po_doc['supplier_id'])
     if not supplier_doc:
         raise HTTPException(status_code=404, detail="Supplier not found")
-    supplier_doc['created_at'] = datetime.fromisoformat(supplier_doc['created_at'])
-    supplier = Supplier(**supplier_doc)
     
-    pdf_bytes = PDFGenerator.generate_po_pdf(po, supplier)
+    etag = f'"{pdf_cache_key(po_doc, supplier_doc)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
     
-    return StreamingResponse(
-        iter([pdf_bytes.getvalue()]),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=PO_{po.po_number}.pdf"}
-    )
+    pdf_bytes = await pdf_renderer.render(etag.strip('"'), po_doc, supplier_doc)
+    headers["Content-Disposition"] = f"attachment; filename=PO_{po_doc['po_number']}.pdf"
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
 # Goods Receipt Routes
-@api_router.post("/goods-receipts", response_model=GoodsReceipt)
-async def create_gr(gr: GRCreate):
-    count = await db.goods_receipts.count_documents({})
-    po = await db.purchase_orders.find_one({"id": gr.po_id}, {"_id": 0})
-    if not po:
+def check_receipt(gr: GRCreate, pos: dict, known_items: set):
+    if gr.po_id not in pos:
         raise HTTPException(status_code=404, detail="PO not found")
-    
-    gr_dict = gr.model_dump()
-    gr_obj = GoodsReceipt(**gr_dict, gr_number=f"GR-{count+1:05d}", po_number=po['po_number'])
-    doc = gr_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['received_date'] = doc['received_date'].isoformat()
-    await db.goods_receipts.insert_one(doc)
-    
-    # Update inventory
-    for item in gr.items:
-        await db.items.update_one(
-            {"id": item.item_id},
-            {"$inc": {"quantity": item.quantity}}
+    line_results = []
+    accepted = []
+    for line, item in enumerate(gr.items):
+        if item.item_id in known_items:
+            accepted.append(item)
+            line_results.append(GRLineResult(line=line, item_id=item.item_id, quantity=item.quantity, status="received"))
+        else:
+            line_results.append(GRLineResult(
+                line=line, item_id=item.item_id, quantity=item.quantity,
+                status="rejected", detail="Item not found"
+            ))
+    if not accepted:
+        raise HTTPException(status_code=400, detail="No receivable lines")
+    return accepted, line_results
+
+async def post_goods_receipts(receipts: List[GRCreate]) -> List[GRBatchResult]:
+    po_ids = list({gr.po_id for gr in receipts})
+    item_ids = list({item.item_id for gr in receipts for item in gr.items})
+    pos = await lookup_cache.get_many("purchase_orders", po_ids)
+    known_items = set(await lookup_cache.get_many("items", item_ids))
+
+    results = [None] * len(receipts)
+    checked = []
+    for index, gr in enumerate(receipts):
+        try:
+            checked.append((index, gr, *check_receipt(gr, pos, known_items)))
+        except HTTPException as e:
+            results[index] = GRBatchResult(index=index, status="failed", detail=e.detail)
+
+    numbers = await sequences.next_numbers("gr", len(checked))
+    received_before = set(await db.goods_receipts.distinct("po_id", {"po_id": {"$in": [gr.po_id for _, gr, *_ in checked]}}))
+    docs = []
+    increments = {}
+    scorecards = []
+    for (index, gr, accepted, line_results), gr_number in zip(checked, numbers):
+        gr_obj = GoodsReceiptResult(
+            **gr.model_dump(exclude={"items"}),
+            items=accepted,
+            gr_number=gr_number,
+            po_number=pos[gr.po_id]['po_number'],
+            line_results=line_results,
         )
-    
-    return gr_obj
+        doc = gr_obj.model_dump(exclude={"line_results"})
+        docs.append(doc)
+        results[index] = GRBatchResult(index=index, status="created", receipt=gr_obj)
+        po = pos[gr.po_id]
+        scorecards.append((po['supplier_id'], receipt_scorecard(doc, po, gr.po_id not in received_before)))
+        received_before.add(gr.po_id)
+        for item in accepted:
+            increments[item.item_id] = increments.get(item.item_id, 0) + item.quantity
+
+    if docs:
+        stock_ops = [UpdateOne({"id": item_id}, receive_stock_update(qty)) for item_id, qty in increments.items()]
+
+        # Receipts and stock move together or not at all
+        async def write(session):
+            await db.goods_receipts.insert_many(docs, session=session)
+            await db.items.bulk_write(stock_ops, ordered=False, session=session)
+
+        await run_transaction(write)
+        await lookup_cache.invalidate("items", list(increments))
+        await record_scorecards(scorecards)
+        invalidate_dashboard()
+    return results
+
+@api_router.post("/goods-receipts", response_model=GoodsReceiptResult)
+async def create_gr(gr: GRCreate):
+    result = (await post_goods_receipts([gr]))[0]
+    if result.receipt is None:
+        status_code = 404 if result.detail == "PO not found" else 400
+        raise HTTPException(status_code=status_code, detail=result.detail)
+    return result.receipt
+
+@api_router.post("/goods-receipts/batch", response_model=List[GRBatchResult])
+async def create_gr_batch(receipts: List[GRCreate]):
+    return await post_goods_receipts(receipts)
 
 @api_router.get("/goods-receipts", response_model=List[GoodsReceipt])
-async def get_grs():
-    grs = await db.goods_receipts.find({}, {"_id": 0}).to_list(1000)
-    for gr in grs:
-        gr['created_at'] = datetime.fromisoformat(gr['created_at'])
-        gr['received_date'] = datetime.fromisoformat(gr['received_date'])
-    return grs
+async def get_grs(response: Response, params: ListParams = Depends()):
+    return await list_documents(db.goods_receipts, GoodsReceipt, params, response)
 
 # Invoice Routes
 @api_router.post("/invoices", response_model=Invoice)
 async def create_invoice(invoice: InvoiceCreate):
-    count = await db.invoices.count_documents({})
-    po = await db.purchase_orders.find_one({"id": invoice.po_id}, {"_id": 0})
+    po = await lookup_cache.get("purchase_orders", invoice.po_id)
     if not po:
         raise HTTPException(status_code=404, detail="PO not found")
     
     invoice_dict = invoice.model_dump()
     total = sum(item.total for item in invoice.items)
+    invoice_number = await sequences.next_number("invoice")
     invoice_obj = Invoice(
         **invoice_dict,
-        invoice_number=f"INV-{count+1:05d}",
+        invoice_number=invoice_number,
         supplier_name=po['supplier_name'],
         total_amount=total
     )
     doc = invoice_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    if doc.get('due_date'):
-        doc['due_date'] = doc['due_date'].isoformat()
-    if doc.get('paid_date'):
-        doc['paid_date'] = doc['paid_date'].isoformat()
     await db.invoices.insert_one(doc)
+    # Booked against the PO's supplier, like the scorecard; the payload's supplier_id isn't trusted
+    await record_spend({**doc, "supplier_id": po['supplier_id']}, doc['created_at'], "invoiced")
+    await record_scorecards([(po['supplier_id'], invoice_scorecard(doc, po))])
     return invoice_obj
 
 @api_router.get("/invoices", response_model=List[Invoice])
-async def get_invoices():
-    invoices = await db.invoices.find({}, {"_id": 0}).to_list(1000)
-    for inv in invoices:
-        inv['created_at'] = datetime.fromisoformat(inv['created_at'])
-        if inv.get('due_date'):
-            inv['due_date'] = datetime.fromisoformat(inv['due_date'])
-        if inv.get('paid_date'):
-            inv['paid_date'] = datetime.fromisoformat(inv['paid_date'])
-    return invoices
+async def get_invoices(response: Response, params: ListParams = Depends()):
+    return await list_documents(db.invoices, Invoice, params, response)
+
+# Spend Analytics
+# spend_rollups holds one document per (supplier, category, month) with the
+# ordered, approved and invoiced amounts. Writes keep it current with $inc and
+# rebuild_spend_rollups recomputes it from scratch.
+UNCATEGORIZED = "Uncategorized"
+SPEND_MEASURES = ("ordered", "approved", "invoiced")
+
+class SpendGroup(str, Enum):
+    SUPPLIER = "supplier"
+    CATEGORY = "category"
+    MONTH = "month"
+
+SPEND_GROUP_FIELDS = {
+    SpendGroup.SUPPLIER: "supplier_id",
+    SpendGroup.CATEGORY: "category",
+    SpendGroup.MONTH: "month",
+}
+
+class SpendRow(BaseModel):
+    supplier_id: Optional[str] = None
+    supplier_name: Optional[str] = None
+    category: Optional[str] = None
+    month: Optional[str] = None
+    ordered_amount: float = 0
+    approved_amount: float = 0
+    invoiced_amount: float = 0
+
+def spend_key(supplier_id: str, category: str, month: str) -> str:
+    return f"{supplier_id}|{category}|{month}"
+
+async def item_categories(item_ids) -> dict:
+    return {i['id']: i.get('category') or UNCATEGORIZED async for i in db.items.find(
+        {"id": {"$in": list(set(item_ids))}}, {"_id": 0, "id": 1, "category": 1}
+    )}
+
+def as_datetime(value) -> datetime:
+    if isinstance(value, str):
+        # Not yet converted by the native-dates migration
+        value = datetime.fromisoformat(value)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+async def record_spend(doc: dict, when: datetime, measure: str):
+    # doc is a PO or invoice: supplier_id, supplier_name and LineItem dicts
+    lines = doc.get('items') or []
+    if not lines:
+        return
+    categories = await item_categories(line['item_id'] for line in lines)
+    month = as_datetime(when).strftime("%Y-%m")
+    amounts = {}
+    for line in lines:
+        category = categories.get(line['item_id'], UNCATEGORIZED)
+        amounts[category] = amounts.get(category, 0) + line['total']
+    ops = [
+        UpdateOne(
+            {"_id": spend_key(doc['supplier_id'], category, month)},
+            {
+                "$inc": {f"{measure}_amount": amount},
+                "$set": {"supplier_name": doc.get('supplier_name')},
+                "$setOnInsert": {"supplier_id": doc['supplier_id'], "category": category, "month": month},
+            },
+            upsert=True,
+        )
+        for category, amount in amounts.items()
+    ]
+    await db.spend_rollups.bulk_write(ops, ordered=False)
+
+def spend_source_pipeline(measure: str, match: dict, po_supplier: bool = False) -> list:
+    # po_supplier: take supplier_id/name from the document's PO (invoices)
+    supplier_stages = [
+        {"$lookup": {"from": "purchase_orders", "localField": "po_id", "foreignField": "id", "as": "po"}},
+        {"$unwind": "$po"},
+        {"$set": {"supplier_id": "$po.supplier_id", "supplier_name": "$po.supplier_name"}},
+    ] if po_supplier else []
+    return [
+        {"$match": match},
+        *supplier_stages,
+        {"$unwind": "$items"},
+        {"$lookup": {"from": "items", "localField": "items.item_id", "foreignField": "id", "as": "catalog"}},
+        {"$group": {
+            "_id": {
+                "supplier_id": "$supplier_id",
+                "category": {"$ifNull": [{"$arrayElemAt": ["$catalog.category", 0]}, UNCATEGORIZED]},
+                "month": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+            },
+            "supplier_name": {"$last": "$supplier_name"},
+            f"{measure}_amount": {"$sum": "$items.total"},
+        }},
+        {"$project": {
+            "_id": {"$concat": ["$_id.supplier_id", "|", "$_id.category", "|", "$_id.month"]},
+            "supplier_id": "$_id.supplier_id",
+            "category": "$_id.category",
+            "month": "$_id.month",
+            "supplier_name": 1,
+            f"{measure}_amount": 1,
+        }},
+        {"$merge": {"into": "spend_rollups_rebuild", "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ]
+
+async def rebuild_spend_rollups() -> int:
+    # Builds into a side collection and swaps it in, so readers never see a
+    # half-built table. Incremental writes made during the rebuild are lost;
+    # run it when the write rate is low. The lock keeps two runs from
+    # interleaving in the side collection.
+    async with mongo_lock("spend_rebuild", "A spend rollup rebuild is already running"):
+        await db.spend_rollups_rebuild.drop()
+        approved = [ApprovalStatus.APPROVED.value, ApprovalStatus.COMPLETED.value]
+        await db.purchase_orders.aggregate(spend_source_pipeline("ordered", {})).to_list(None)
+        await db.purchase_orders.aggregate(spend_source_pipeline("approved", {"status": {"$in": approved}})).to_list(None)
+        await db.invoices.aggregate(spend_source_pipeline("invoiced", {}, po_supplier=True)).to_list(None)
+        rows = await db.spend_rollups_rebuild.count_documents({})
+        if rows:
+            await db.spend_rollups_rebuild.rename("spend_rollups", dropTarget=True)
+        else:
+            await db.spend_rollups.delete_many({})
+        for keys, options in INDEXES["spend_rollups"]:
+            await db.spend_rollups.create_index(keys, **options)
+    return rows
+
+@api_router.get("/analytics/spend", response_model=List[SpendRow])
+async def get_spend(
+    group_by: List[SpendGroup] = Query([SpendGroup.SUPPLIER]),
+    supplier_id: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    month_from: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    month_to: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+):
+    match = {}
+    if supplier_id:
+        match["supplier_id"] = supplier_id
+    if category:
+        match["category"] = category
+    months = {}
+    if month_from:
+        months["$gte"] = month_from
+    if month_to:
+        months["$lte"] = month_to
+    if months:
+        match["month"] = months
+    group_fields = [SPEND_GROUP_FIELDS[g] for g in dict.fromkeys(group_by)]
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {field: f"${field}" for field in group_fields},
+            "supplier_name": {"$last": "$supplier_name"},
+            **{f"{m}_amount": {"$sum": f"${m}_amount"} for m in SPEND_MEASURES},
+        }},
+        {"$sort": {f"_id.{field}": 1 for field in group_fields}},
+    ]
+    rows = []
+    async for row in db.spend_rollups.aggregate(pipeline):
+        key = row.pop('_id')
+        if "supplier_id" not in key:
+            row.pop('supplier_name')
+        rows.append({**key, **row})
+    return rows
+
+async def run_spend_rebuild() -> dict:
+    rows = await rebuild_spend_rollups()
+    return {"message": "Spend rollups rebuilt", "rows": rows}
+
+@api_router.post("/analytics/spend/rebuild")
+async def rebuild_spend(background: bool = Depends(run_in_background)):
+    if background:
+        return await enqueue_job(JobType.SPEND_REBUILD, {})
+    return await run_spend_rebuild()
+
+# Supplier Scorecards
+# Delivery and billing performance per supplier, stored on the supplier
+# document so the supplier routes return it with no extra query. Receipts and
+# invoices add to the running totals, and the same update recomputes the
+# ratios and rating from them. rebuild_supplier_scorecards recomputes every
+# supplier in one aggregation pass over receipts and invoices.
+SCORECARD_COUNTERS = (
+    "receipts", "lead_time_days_total", "dated_receipts", "on_time_receipts",
+    "ordered_qty", "received_qty", "invoiced_amount", "invoiced_at_po_price",
+)
+# delivery_date is a day: a receipt any time on that day is on time
+ON_TIME_GRACE = timedelta(days=1)
+
+def if_known(value: str, expression) -> dict:
+    return {"$cond": [{"$eq": [{"$ifNull": [value, None]}, None]}, None, expression]}
+
+def scorecard_ratio(numerator: str, denominator: str) -> dict:
+    return {"$cond": [
+        {"$gt": [f"$scorecard.{denominator}", 0]},
+        {"$divide": [f"$scorecard.{numerator}", f"$scorecard.{denominator}"]},
+        None,
+    ]}
+
+# Recompute the derived fields from the totals, against the current document
+SCORECARD_STAGES = [
+    {"$set": {
+        "scorecard.avg_lead_time_days": scorecard_ratio("lead_time_days_total", "receipts"),
+        "scorecard.on_time_rate": scorecard_ratio("on_time_receipts", "dated_receipts"),
+        "scorecard.fill_rate": scorecard_ratio("received_qty", "ordered_qty"),
+        "scorecard.price_variance_pct": {"$cond": [
+            {"$gt": ["$scorecard.invoiced_at_po_price", 0]},
+            {"$subtract": [{"$divide": ["$scorecard.invoiced_amount", "$scorecard.invoiced_at_po_price"]}, 1]},
+            None,
+        ]},
+    }},
+    # The mean of on-time rate, fill rate (capped at 1) and price accuracy,
+    # over whichever are known, scaled to 0-5
+    {"$set": {"rating": {"$round": [{"$multiply": [5, {"$avg": [
+        "$scorecard.on_time_rate",
+        if_known("$scorecard.fill_rate", {"$min": ["$scorecard.fill_rate", 1]}),
+        if_known("$scorecard.price_variance_pct",
+                 {"$max": [0, {"$subtract": [1, {"$abs": "$scorecard.price_variance_pct"}]}]}),
+    ]}]}, 2]}}},
+]
+
+def po_quantities(po: dict):
+    ordered_qty, ordered_amount = {}, {}
+    for line in po.get('items') or []:
+        ordered_qty[line['item_id']] = ordered_qty.get(line['item_id'], 0) + line['quantity']
+        ordered_amount[line['item_id']] = ordered_amount.get(line['item_id'], 0) + line['total']
+    return ordered_qty, ordered_amount
+
+def receipt_scorecard(gr_doc: dict, po: dict, first_receipt: bool) -> dict:
+    ordered_qty, _ = po_quantities(po)
+    received_at = as_datetime(gr_doc['received_date'])
+    deltas = {
+        "receipts": 1,
+        "lead_time_days_total": (received_at - as_datetime(po['created_at'])).total_seconds() / 86400,
+        "dated_receipts": 0,
+        "on_time_receipts": 0,
+        # The PO's ordered quantity counts once, with its first receipt
+        "ordered_qty": sum(ordered_qty.values()) if first_receipt else 0,
+        "received_qty": sum(line['quantity'] for line in gr_doc['items'] if line['item_id'] in ordered_qty),
+    }
+    if po.get('delivery_date'):
+        deltas["dated_receipts"] = 1
+        deltas["on_time_receipts"] = int(received_at < as_datetime(po['delivery_date']) + ON_TIME_GRACE)
+    return deltas
+
+def invoice_scorecard(invoice_doc: dict, po: dict) -> dict:
+    # Only lines on the PO have a price to compare against
+    ordered_qty, ordered_amount = po_quantities(po)
+    deltas = {"invoiced_amount": 0, "invoiced_at_po_price": 0}
+    for line in invoice_doc['items']:
+        if ordered_qty.get(line['item_id'], 0) > 0:
+            deltas["invoiced_amount"] += line['total']
+            deltas["invoiced_at_po_price"] += line['quantity'] * ordered_amount[line['item_id']] / ordered_qty[line['item_id']]
+    return deltas
+
+async def record_scorecards(deltas: List[tuple]):
+    # deltas: (supplier_id, {counter: amount}); one update per supplier
+    totals = {}
+    for supplier_id, delta in deltas:
+        supplier_totals = totals.setdefault(supplier_id, {})
+        for counter, amount in delta.items():
+            supplier_totals[counter] = supplier_totals.get(counter, 0) + amount
+    if not totals:
+        return
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne({"id": supplier_id}, [
+            {"$set": {
+                **{f"scorecard.{c}": {"$add": [{"$ifNull": [f"$scorecard.{c}", 0]}, amount]} for c, amount in counters.items()},
+                "scorecard.updated_at": now,
+            }},
+            *SCORECARD_STAGES,
+        ])
+        for supplier_id, counters in totals.items()
+    ]
+    await db.suppliers.bulk_write(ops, ordered=False)
+    await lookup_cache.invalidate("suppliers", list(totals))
+
+def po_lookup_stages() -> list:
+    return [
+        {"$lookup": {"from": "purchase_orders", "localField": "po_id", "foreignField": "id", "as": "po"}},
+        {"$unwind": "$po"},
+    ]
+
+def scorecard_pipeline(updated_at: datetime) -> list:
+    # Mirrors receipt_scorecard and invoice_scorecard
+    receipts = [
+        *po_lookup_stages(),
+        {"$project": {
+            "po_id": 1,
+            "supplier_id": "$po.supplier_id",
+            "lead_time_days": {"$divide": [{"$subtract": ["$received_date", "$po.created_at"]}, 86400000]},
+            "dated": {"$cond": [{"$ifNull": ["$po.delivery_date", False]}, 1, 0]},
+            "on_time": {"$cond": [{"$and": [
+                {"$ifNull": ["$po.delivery_date", False]},
+                {"$lt": ["$received_date", {"$add": ["$po.delivery_date", int(ON_TIME_GRACE.total_seconds() * 1000)]}]},
+            ]}, 1, 0]},
+            "ordered_qty": {"$sum": "$po.items.quantity"},
+            "received_qty": {"$sum": {"$map": {
+                "input": {"$filter": {"input": "$items", "cond": {"$in": ["$$this.item_id", "$po.items.item_id"]}}},
+                "in": "$$this.quantity",
+            }}},
+        }},
+        {"$group": {
+            "_id": "$po_id",
+            "supplier_id": {"$first": "$supplier_id"},
+            "receipts": {"$sum": 1},
+            "lead_time_days_total": {"$sum": "$lead_time_days"},
+            "dated_receipts": {"$sum": "$dated"},
+            "on_time_receipts": {"$sum": "$on_time"},
+            "ordered_qty": {"$first": "$ordered_qty"},
+            "received_qty": {"$sum": "$received_qty"},
+        }},
+    ]
+    invoice_lines = [
+        *po_lookup_stages(),
+        {"$unwind": "$items"},
+        {"$project": {
+            "supplier_id": "$po.supplier_id",
+            "item": "$items",
+            "po_lines": {"$filter": {"input": "$po.items", "cond": {"$eq": ["$$this.item_id", "$items.item_id"]}}},
+        }},
+        {"$match": {"$expr": {"$gt": [{"$sum": "$po_lines.quantity"}, 0]}}},
+        {"$project": {
+            "supplier_id": 1,
+            "invoiced_amount": "$item.total",
+            "invoiced_at_po_price": {"$multiply": [
+                "$item.quantity", {"$divide": [{"$sum": "$po_lines.total"}, {"$sum": "$po_lines.quantity"}]},
+            ]},
+        }},
+    ]
+    return [
+        *receipts,
+        {"$unionWith": {"coll": "invoices", "pipeline": invoice_lines}},
+        {"$group": {"_id": "$supplier_id", **{c: {"$sum": f"${c}"} for c in SCORECARD_COUNTERS}}},
+        {"$project": {"_id": 0, "id": "$_id", "scorecard": {
+            **{c: f"${c}" for c in SCORECARD_COUNTERS}, "updated_at": {"$literal": updated_at},
+        }}},
+        *SCORECARD_STAGES,
+        {"$merge": {"into": "suppliers", "on": "id", "whenMatched": "merge", "whenNotMatched": "discard"}},
+    ]
+
+async def rebuild_supplier_scorecards() -> int:
+    # Like the spend rebuild, receipts and invoices posted while it runs can
+    # be overwritten; run it when the write rate is low
+    async with mongo_lock("scorecard_rebuild", "A supplier scorecard rebuild is already running"):
+        started = datetime.now(timezone.utc)
+        await db.goods_receipts.aggregate(scorecard_pipeline(started), allowDiskUse=True).to_list(None)
+        # Suppliers with no receipts or invoices
+        await db.suppliers.update_many(
+            {"scorecard.updated_at": {"$not": {"$gte": started}}},
+            {"$set": {"scorecard": {**SupplierScorecard().model_dump(), "updated_at": started}, "rating": None}},
+        )
+    await lookup_cache.invalidate("suppliers")
+    return await db.suppliers.count_documents({"scorecard.receipts": {"$gt": 0}})
+
+async def run_scorecard_rebuild() -> dict:
+    suppliers = await rebuild_supplier_scorecards()
+    return {"message": "Supplier scorecards rebuilt", "suppliers_with_receipts": suppliers}
+
+@api_router.post("/analytics/supplier-scorecards/rebuild")
+async def rebuild_scorecards(background: bool = Depends(run_in_background)):
+    if background:
+        return await enqueue_job(JobType.SCORECARD_REBUILD, {})
+    return await run_scorecard_rebuild()
+
+# Three-way Match
+# Reconciles PO, goods receipt and invoice quantities and prices per PO line.
+# Mongo sums each source per (po_id, item_id); the comparison runs
+# column-wise in pandas so a full run over 100k+ invoices stays in seconds.
+MATCH_RUN_ID = "three_way_match"
+MATCH_LINE_KEYS = ["po_id", "item_id"]
+MATCH_QTY_TOLERANCE = float(os.environ.get('MATCH_QTY_TOLERANCE', '0'))
+MATCH_PRICE_TOLERANCE = float(os.environ.get('MATCH_PRICE_TOLERANCE', '0.01'))
+MATCH_WRITE_BATCH = 5000
+
+class MatchExceptionType(str, Enum):
+    NOT_ON_PO = "not_on_po"
+    OVER_RECEIVED = "over_received"
+    OVER_INVOICED = "over_invoiced"
+    PRICE_VARIANCE = "price_variance"
+
+class MatchException(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    run_id: str
+    po_id: str
+    item_id: str
+    types: List[MatchExceptionType]
+    ordered_qty: float
+    received_qty: float
+    invoiced_qty: float
+    quantity_variance: float
+    po_unit_price: Optional[float] = None
+    invoiced_unit_price: Optional[float] = None
+    price_variance_pct: Optional[float] = None
+    detected_at: datetime
+
+class MatchRunSummary(BaseModel):
+    run_id: str
+    incremental: bool
+    pos_checked: int
+    lines_checked: int
+    exceptions: int
+    by_type: dict
+    elapsed_ms: float
+
+def line_totals_pipeline(match: dict, po_field: str, measures: dict) -> list:
+    return [
+        {"$match": match},
+        {"$unwind": "$items"},
+        {"$group": {"_id": {"po_id": f"${po_field}", "item_id": "$items.item_id"}, **measures}},
+        {"$project": {"_id": 0, "po_id": "$_id.po_id", "item_id": "$_id.item_id", **{k: 1 for k in measures}}},
+    ]
+
+async def load_line_totals(collection, match: dict, po_field: str, measures: dict) -> pd.DataFrame:
+    rows = await collection.aggregate(line_totals_pipeline(match, po_field, measures), allowDiskUse=True).to_list(None)
+    return pd.DataFrame(rows, columns=[*MATCH_LINE_KEYS, *measures])
+
+def match_lines(po: pd.DataFrame, gr: pd.DataFrame, inv: pd.DataFrame, qty_tolerance: float, price_tolerance: float):
+    lines = po.merge(gr, on=MATCH_LINE_KEYS, how="outer").merge(inv, on=MATCH_LINE_KEYS, how="outer")
+    measures = ["ordered_qty", "ordered_amount", "received_qty", "invoiced_qty", "invoiced_amount"]
+    lines[measures] = lines[measures].fillna(0).astype(float)
+    # Nothing to reconcile until something was received or billed
+    lines = lines[(lines["received_qty"] > 0) | (lines["invoiced_qty"] > 0)].reset_index(drop=True)
+
+    ordered = lines["ordered_qty"].to_numpy()
+    received = lines["received_qty"].to_numpy()
+    invoiced = lines["invoiced_qty"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        po_price = np.where(ordered > 0, lines["ordered_amount"].to_numpy() / ordered, np.nan)
+        invoiced_price = np.where(invoiced > 0, lines["invoiced_amount"].to_numpy() / invoiced, np.nan)
+        price_variance = (invoiced_price - po_price) / po_price
+
+    flags = {
+        MatchExceptionType.NOT_ON_PO: ordered == 0,
+        MatchExceptionType.OVER_RECEIVED: (ordered > 0) & (received > ordered * (1 + qty_tolerance)),
+        MatchExceptionType.OVER_INVOICED: invoiced > received * (1 + qty_tolerance),
+        MatchExceptionType.PRICE_VARIANCE: np.nan_to_num(np.abs(price_variance), nan=0) > price_tolerance,
+    }
+    lines["po_unit_price"] = po_price
+    lines["invoiced_unit_price"] = invoiced_price
+    lines["price_variance_pct"] = price_variance
+    lines["quantity_variance"] = invoiced - received
+    for flag, mask in flags.items():
+        lines[flag.value] = mask
+    exceptions = lines[np.logical_or.reduce(list(flags.values()))] if len(lines) else lines
+    return lines, exceptions
+
+def exception_documents(exceptions: pd.DataFrame, run_id: str, detected_at: datetime) -> List[dict]:
+    flag_columns = [t.value for t in MatchExceptionType]
+    columns = [
+        *MATCH_LINE_KEYS, "ordered_qty", "received_qty", "invoiced_qty", "quantity_variance",
+        "po_unit_price", "invoiced_unit_price", "price_variance_pct",
+    ]
+    values = exceptions[columns].astype(object).where(exceptions[columns].notna(), None).to_dict("records")
+    flags = exceptions[flag_columns].to_numpy()
+    docs = []
+    for row, row_flags in zip(values, flags):
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "run_id": run_id,
+            **row,
+            "types": [t for t, flagged in zip(flag_columns, row_flags) if flagged],
+            "detected_at": detected_at,
+        })
+    return docs
+
+async def touched_po_ids(since: datetime) -> List[str]:
+    po_ids = set(await db.purchase_orders.distinct("id", {"updated_at": {"$gte": since}}))
+    po_ids.update(await db.goods_receipts.distinct("po_id", {"created_at": {"$gte": since}}))
+    po_ids.update(await db.invoices.distinct("po_id", {"created_at": {"$gte": since}}))
+    return list(po_ids)
+
+async def run_three_way_match(incremental: bool, qty_tolerance: float, price_tolerance: float) -> MatchRunSummary:
+    started = time.perf_counter()
+    run_id = str(uuid.uuid4())
+    run_started_at = datetime.now(timezone.utc)
+    state = await db.match_runs.find_one({"_id": MATCH_RUN_ID}) or {}
+    since = state.get('last_run_at') if incremental else None
+
+    po_match, line_match = {}, {}
+    if since:
+        po_ids = await touched_po_ids(since)
+        po_match, line_match = {"id": {"$in": po_ids}}, {"po_id": {"$in": po_ids}}
+
+    po, gr, inv = await asyncio.gather(
+        load_line_totals(db.purchase_orders, po_match, "id", {
+            "ordered_qty": {"$sum": "$items.quantity"}, "ordered_amount": {"$sum": "$items.total"},
+        }),
+        load_line_totals(db.goods_receipts, line_match, "po_id", {"received_qty": {"$sum": "$items.quantity"}}),
+        load_line_totals(db.invoices, line_match, "po_id", {
+            "invoiced_qty": {"$sum": "$items.quantity"}, "invoiced_amount": {"$sum": "$items.total"},
+        }),
+    )
+    lines, exceptions = await asyncio.to_thread(match_lines, po, gr, inv, qty_tolerance, price_tolerance)
+    docs = await asyncio.to_thread(exception_documents, exceptions, run_id, run_started_at)
+
+    # Replace the previous findings for the POs this run covered
+    await db.match_exceptions.delete_many(line_match)
+    for start in range(0, len(docs), MATCH_WRITE_BATCH):
+        await db.match_exceptions.insert_many(docs[start:start + MATCH_WRITE_BATCH], ordered=False)
+    await db.match_runs.update_one(
+        {"_id": MATCH_RUN_ID},
+        {"$set": {"last_run_at": run_started_at, "last_run_id": run_id}},
+        upsert=True,
+    )
+
+    by_type = {t.value: int(exceptions[t.value].sum()) if len(exceptions) else 0 for t in MatchExceptionType}
+    return MatchRunSummary(
+        run_id=run_id,
+        incremental=bool(since),
+        pos_checked=int(lines["po_id"].nunique()) if len(lines) else 0,
+        lines_checked=len(lines),
+        exceptions=len(docs),
+        by_type=by_type,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+
+@api_router.post("/reconciliation/three-way-match", response_model=MatchRunSummary)
+async def three_way_match(
+    incremental: bool = Query(True),
+    qty_tolerance: float = Query(MATCH_QTY_TOLERANCE, ge=0),
+    price_tolerance: float = Query(MATCH_PRICE_TOLERANCE, ge=0),
+    background: bool = Depends(run_in_background),
+):
+    if background:
+        return await enqueue_job(JobType.THREE_WAY_MATCH, {
+            "incremental": incremental, "qty_tolerance": qty_tolerance, "price_tolerance": price_tolerance,
+        })
+    return await run_three_way_match(incremental, qty_tolerance, price_tolerance)
+
+@api_router.get("/reconciliation/exceptions", response_model=List[MatchException])
+async def get_match_exceptions(
+    po_id: Optional[str] = Query(None),
+    type: Optional[MatchExceptionType] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    query = {}
+    if po_id:
+        query["po_id"] = po_id
+    if type:
+        query["types"] = type.value
+    return await db.match_exceptions.find(query, {"_id": 0}).sort("detected_at", -1).limit(limit).to_list(limit)
+
+# Replenishment
+# Drafts one requisition per supplier for items at or below their reorder
+# level. There is no consumption ledger, so demand is estimated from goods
+# received over the lookback window. Stock already on open POs or open
+# requisitions counts towards the position, so repeated runs don't re-order.
+REORDER_LOOKBACK_DAYS = int(os.environ.get('REORDER_LOOKBACK_DAYS', '90'))
+REORDER_COVER_DAYS = int(os.environ.get('REORDER_COVER_DAYS', '30'))
+REORDER_MAX_LINES = int(os.environ.get('REORDER_MAX_LINES', '500'))
+REORDER_WRITE_BATCH = 1000
+OPEN_PO_STATUSES = [ApprovalStatus.DRAFT.value, ApprovalStatus.PENDING.value, ApprovalStatus.APPROVED.value]
+OPEN_PR_STATUSES = [PRStatus.DRAFT.value, PRStatus.SUBMITTED.value, PRStatus.APPROVED.value]
+REORDER_ITEM_FIELDS = ["id", "name", "unit_price", "quantity", "reorder_level", "supplier_id"]
+
+class ReorderRunRequest(BaseModel):
+    dry_run: bool = False
+    requester_id: str = "system"
+    requester_name: str = "Reorder engine"
+    department: str = "Procurement"
+    lookback_days: int = Field(REORDER_LOOKBACK_DAYS, ge=1, le=365)
+    cover_days: int = Field(REORDER_COVER_DAYS, ge=1, le=365)
+    supplier_id: Optional[str] = None
+    category: Optional[str] = None
+
+class ReorderLine(LineItem):
+    on_hand: int
+    on_order: int
+    requested: int
+    daily_demand: float
+
+REORDER_LINES = TypeAdapter(List[ReorderLine])
+
+class ReorderProposal(BaseModel):
+    supplier_id: Optional[str] = None
+    supplier_name: Optional[str] = None
+    pr_id: Optional[str] = None
+    pr_number: Optional[str] = None
+    lines: List[ReorderLine]
+    total_amount: float
+
+class ReorderRunSummary(BaseModel):
+    dry_run: bool
+    items_scanned: int
+    items_proposed: int
+    requisitions: List[ReorderProposal]
+    elapsed_ms: float
+
+async def load_reorder_candidates(request: ReorderRunRequest) -> pd.DataFrame:
+    # Anything that can need reordering has quantity <= reorder_level, which is
+    # exactly the partial is_low_stock index
+    query = {"is_low_stock": True}
+    if request.supplier_id:
+        query["supplier_id"] = request.supplier_id
+    if request.category:
+        query["category"] = request.category
+    projection = {"_id": 0, **{f: 1 for f in REORDER_ITEM_FIELDS}}
+    rows = await db.items.find(query, projection).batch_size(5000).to_list(None)
+    return pd.DataFrame(rows, columns=REORDER_ITEM_FIELDS).rename(columns={"id": "item_id"})
+
+async def load_supply(since: datetime):
+    demand, ordered, requested = await asyncio.gather(
+        load_line_totals(db.goods_receipts, {"created_at": {"$gte": since}}, "po_id", {
+            "received_recent": {"$sum": "$items.quantity"},
+        }),
+        load_line_totals(db.purchase_orders, {"status": {"$in": OPEN_PO_STATUSES}}, "id", {
+            "ordered_qty": {"$sum": "$items.quantity"},
+        }),
+        load_line_totals(db.purchase_requisitions, {"status": {"$in": OPEN_PR_STATUSES}}, "id", {
+            "requested": {"$sum": "$items.quantity"},
+        }),
+    )
+    open_po_ids = ordered["po_id"].unique().tolist()
+    received = await load_line_totals(db.goods_receipts, {"po_id": {"$in": open_po_ids}}, "po_id", {
+        "received_qty": {"$sum": "$items.quantity"},
+    }) if open_po_ids else pd.DataFrame(columns=[*MATCH_LINE_KEYS, "received_qty"])
+    return demand, ordered, received, requested
+
+def reorder_quantities(items: pd.DataFrame, demand: pd.DataFrame, ordered: pd.DataFrame, received: pd.DataFrame,
+                       requested: pd.DataFrame, lookback_days: int, cover_days: int) -> pd.DataFrame:
+    # Order up to reorder_level plus cover_days of demand (at least another
+    # reorder_level when there's no history) once the position is at or below
+    # reorder_level. Position = on hand + open PO balance + open requisitions.
+    open_lines = ordered.merge(received, on=MATCH_LINE_KEYS, how="left")
+    open_lines["on_order"] = (
+        open_lines["ordered_qty"].astype(float) - open_lines["received_qty"].astype(float).fillna(0)
+    ).clip(lower=0)
+    per_item = {
+        "received_recent": demand.groupby("item_id")["received_recent"].sum(),
+        "on_order": open_lines.groupby("item_id")["on_order"].sum(),
+        "requested": requested.groupby("item_id")["requested"].sum(),
+    }
+    df = items.copy()
+    for column in ("quantity", "reorder_level", "unit_price"):
+        df[column] = df[column].astype(float).fillna(0)
+    for column, totals in per_item.items():
+        df[column] = df["item_id"].map(totals).astype(float).fillna(0)
+
+    df["daily_demand"] = df["received_recent"] / lookback_days
+    position = df["quantity"] + df["on_order"] + df["requested"]
+    cover = np.maximum(np.ceil(df["daily_demand"] * cover_days), df["reorder_level"])
+    df["order_qty"] = np.where(position <= df["reorder_level"], df["reorder_level"] + cover - position, 0)
+    return df[df["order_qty"] > 0].sort_values(["supplier_id", "name"], na_position="last")
+
+def reorder_proposals(lines: pd.DataFrame, supplier_names: dict) -> List[ReorderProposal]:
+    rows = pd.DataFrame({
+        "item_id": lines["item_id"],
+        "item_name": lines["name"],
+        "quantity": lines["order_qty"].astype(int),
+        "unit_price": lines["unit_price"].astype(float),
+        "total": (lines["order_qty"] * lines["unit_price"]).round(2),
+        "on_hand": lines["quantity"].astype(int),
+        "on_order": lines["on_order"].astype(int),
+        "requested": lines["requested"].astype(int),
+        "daily_demand": lines["daily_demand"].round(3),
+    })
+    supplier_ids = lines["supplier_id"].where(lines["supplier_id"].notna(), None)
+    proposals = []
+    for supplier_id, group in rows.groupby(supplier_ids.fillna(""), sort=False):
+        for start in range(0, len(group), REORDER_MAX_LINES):
+            chunk = group.iloc[start:start + REORDER_MAX_LINES]
+            proposals.append(ReorderProposal(
+                supplier_id=supplier_id or None,
+                supplier_name=supplier_names.get(supplier_id),
+                lines=REORDER_LINES.validate_python(chunk.to_dict("records")),
+                total_amount=round(float(chunk["total"].sum()), 2),
+            ))
+    return proposals
+
+def proposal_requisition(proposal: ReorderProposal, pr_number: str, request: ReorderRunRequest) -> PurchaseRequisition:
+    supplier = proposal.supplier_name or proposal.supplier_id or "unassigned supplier"
+    return PurchaseRequisition(
+        pr_number=pr_number,
+        requester_id=request.requester_id,
+        requester_name=request.requester_name,
+        department=request.department,
+        # Serialized as LineItem, so the reorder context isn't stored
+        items=proposal.lines,
+        total_amount=proposal.total_amount,
+        justification=f"Reorder proposal for {supplier}: {len(proposal.lines)} items at or below reorder level",
+    )
+
+async def run_reorder(request: ReorderRunRequest) -> ReorderRunSummary:
+    started = time.perf_counter()
+    since = datetime.now(timezone.utc) - timedelta(days=request.lookback_days)
+    items, (demand, ordered, received, requested) = await asyncio.gather(
+        load_reorder_candidates(request), load_supply(since)
+    )
+    lines = await asyncio.to_thread(
+        reorder_quantities, items, demand, ordered, received, requested, request.lookback_days, request.cover_days
+    )
+    supplier_ids = lines["supplier_id"].dropna().unique().tolist()
+    suppliers = await lookup_cache.get_many("suppliers", supplier_ids)
+    proposals = await asyncio.to_thread(
+        reorder_proposals, lines, {sid: doc.get('name') for sid, doc in suppliers.items()}
+    )
+
+    if not request.dry_run and proposals:
+        numbers = await sequences.next_numbers("pr", len(proposals))
+        docs = []
+        for proposal, pr_number in zip(proposals, numbers):
+            pr_obj = proposal_requisition(proposal, pr_number, request)
+            proposal.pr_id, proposal.pr_number = pr_obj.id, pr_number
+            docs.append(pr_obj.model_dump())
+        for start in range(0, len(docs), REORDER_WRITE_BATCH):
+            await db.purchase_requisitions.insert_many(docs[start:start + REORDER_WRITE_BATCH], ordered=False)
+
+    return ReorderRunSummary(
+        dry_run=request.dry_run,
+        items_scanned=len(items),
+        items_proposed=len(lines),
+        requisitions=proposals,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+
+@api_router.post("/replenishment/reorder-run", response_model=ReorderRunSummary)
+async def reorder_run(request: ReorderRunRequest, background: bool = Depends(run_in_background)):
+    if background:
+        return await enqueue_job(JobType.REORDER_RUN, request.model_dump())
+    return await run_reorder(request)
+
+# Exports
+# One row per line item; header fields repeat on every line of a document.
+EXPORT_BATCH_SIZE = 1000
+EXPORT_LINE_FIELDS = ["item_id", "item_name", "quantity", "unit_price", "total"]
+
+class ExportDataset(str, Enum):
+    PURCHASE_ORDERS = "purchase-orders"
+    GOODS_RECEIPTS = "goods-receipts"
+    INVOICES = "invoices"
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    XLSX = "xlsx"
+
+# dataset -> (collection, header fields)
+EXPORT_DATASETS = {
+    ExportDataset.PURCHASE_ORDERS: ("purchase_orders", [
+        "po_number", "status", "supplier_id", "supplier_name", "pr_id", "approval_level",
+        "total_amount", "delivery_date", "created_by", "created_at",
+    ]),
+    ExportDataset.GOODS_RECEIPTS: ("goods_receipts", [
+        "gr_number", "po_id", "po_number", "status", "received_by", "received_date", "created_at",
+    ]),
+    ExportDataset.INVOICES: ("invoices", [
+        "invoice_number", "po_id", "gr_id", "supplier_id", "supplier_name", "status",
+        "total_amount", "tax_amount", "due_date", "paid_date", "created_at",
+    ]),
+}
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+async def export_rows(collection, header_fields: List[str], query: dict):
+    # Yields batches of flattened rows straight off the cursor
+    projection = {"_id": 0, "items": 1, **{f: 1 for f in header_fields}}
+    cursor = collection.find(query, projection).sort(KEYSET_SORT).batch_size(EXPORT_BATCH_SIZE)
+    batch = []
+    async for doc in cursor:
+        header = [export_value(doc.get(f)) for f in header_fields]
+        for line_no, line in enumerate(doc.get('items') or [], start=1):
+            batch.append([*header, line_no, *(export_value(line.get(f)) for f in EXPORT_LINE_FIELDS)])
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def stream_csv(columns: List[str], batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+# Minimal SpreadsheetML package; the worksheet part is written incrementally
+XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+XML_INVALID_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def xlsx_row(values) -> str:
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            text = xml_escape(XML_INVALID_CHARS.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t>{text}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+async def stream_xlsx(columns: List[str], batches):
+    sink = ZipStream()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    for name, content in XLSX_STATIC_PARTS.items():
+        archive.writestr(name, content)
+    yield sink.drain()
+    with archive.open("xl/worksheets/sheet1.xml", 'w', force_zip64=True) as sheet:
+        sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+        )
+        sheet.write(xlsx_row(columns).encode())
+        async for batch in batches:
+            sheet.write("".join(xlsx_row(row) for row in batch).encode())
+            yield sink.drain()
+        sheet.write(b'</sheetData></worksheet>')
+    archive.close()
+    yield sink.drain()
+
+def export_file(dataset: ExportDataset, format: ExportFormat,
+                created_from: Optional[datetime], created_to: Optional[datetime]) -> StreamedFile:
+    collection, header_fields = EXPORT_DATASETS[dataset]
+    columns = [*header_fields, "line_no", *EXPORT_LINE_FIELDS]
+    batches = export_rows(db[collection], header_fields, created_range(created_from, created_to))
+    filename = f"{dataset.value}.{format.value}"
+    if format == ExportFormat.XLSX:
+        return StreamedFile(filename, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", stream_xlsx(columns, batches))
+    return StreamedFile(filename, "text/csv", stream_csv(columns, batches))
+
+@api_router.get("/exports/{dataset}")
+async def export_dataset(
+    dataset: ExportDataset,
+    format: ExportFormat = Query(ExportFormat.CSV),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    background: bool = Depends(run_in_background),
+):
+    if background:
+        return await enqueue_job(JobType.EXPORT, {
+            "dataset": dataset.value, "format": format.value, "created_from": created_from, "created_to": created_to,
+        })
+    return file_response(export_file(dataset, format, created_from, created_to))
+
+# Background jobs
+# Heavy routes accept background=true: the work is stored in `jobs` and the
+# route returns 202. By default each web process also runs JOB_WORKERS tasks
+# that claim queued jobs by priority, with per-type limits so one batch type
+# can't take every slot. Deployments that run worker.py (see
+# worker.supervisord.conf) set JOB_WORKERS=0 in the web processes, so row
+# building, compression and GridFS writes never share an event loop with HTTP
+# requests. Processes with workers record a heartbeat, and a web process with
+# none of its own refuses background work while no heartbeat is recent. A
+# running job holds a lease its worker renews, so jobs left behind by a
+# crashed process are claimed again.
+# Worker tasks in this process; 0 when worker.py runs the jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '2'))
+JOB_HEARTBEAT_SECONDS = 10
+# A worker that hasn't checked in for this long is gone
+JOB_WORKER_STALE = timedelta(seconds=3 * JOB_HEARTBEAT_SECONDS)
+JOB_LEASE = timedelta(seconds=60)
+JOB_MAX_ATTEMPTS = 3
+JOB_RETENTION = timedelta(days=int(os.environ.get('JOB_RETENTION_DAYS', '7')))
+JOB_FILES_BUCKET = "job_files"
+# Uploads parked for import jobs are spooled to disk past this size
+JOB_SPOOL_BYTES = 8 * 1024 * 1024
+
+class JobType(str, Enum):
+    PO_PDF_EXPORT = "po_pdf_export"
+    EXPORT = "export"
+    ITEM_IMPORT = "item_import"
+    SUPPLIER_IMPORT = "supplier_import"
+    SPEND_REBUILD = "spend_rebuild"
+    SCORECARD_REBUILD = "scorecard_rebuild"
+    THREE_WAY_MATCH = "three_way_match"
+    REORDER_RUN = "reorder_run"
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+# type -> (max running per process, priority; higher runs first)
+JOB_TYPES = {
+    JobType.PO_PDF_EXPORT: (1, 10),
+    JobType.EXPORT: (2, 10),
+    JobType.ITEM_IMPORT: (1, 5),
+    JobType.SUPPLIER_IMPORT: (1, 5),
+    JobType.SPEND_REBUILD: (1, 0),
+    JobType.SCORECARD_REBUILD: (1, 0),
+    JobType.THREE_WAY_MATCH: (1, 0),
+    JobType.REORDER_RUN: (1, 0),
+}
+
+class JobResultFile(BaseModel):
+    file_id: str
+    filename: str
+    media_type: str
+    length: int
+
+class Job(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    type: JobType
+    status: JobStatus = JobStatus.QUEUED
+    priority: int = 0
+    params: dict = Field(default_factory=dict)
+    result: Any = None
+    result_file: Optional[JobResultFile] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class JobQueue:
+    def __init__(self, database, workers: int, handlers: dict):
+        self.db = database
+        self.workers = workers
+        self.handlers = handlers
+        self.running = {job_type: 0 for job_type in JobType}
+        self.origin = str(uuid.uuid4())
+        self._files = None
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        self._tasks = []
+
+    @property
+    def files(self) -> AsyncIOMotorGridFSBucket:
+        if self._files is None:
+            self._files = AsyncIOMotorGridFSBucket(self.db, bucket_name=JOB_FILES_BUCKET)
+        return self._files
+
+    async def submit(self, job_type: JobType, params: dict) -> Job:
+        _, priority = JOB_TYPES[job_type]
+        job = Job(type=job_type, params=params, priority=priority)
+        await self.db.jobs.insert_one(job.model_dump())
+        self._wakeup.set()
+        return job
+
+    async def _claim(self) -> Optional[dict]:
+        async with self._claim_lock:
+            open_types = [t.value for t, (limit, _) in JOB_TYPES.items() if self.running[t] < limit]
+            if not open_types:
+                return None
+            now = datetime.now(timezone.utc)
+            job = await self.db.jobs.find_one_and_update(
+                {"type": {"$in": open_types}, "attempts": {"$lt": JOB_MAX_ATTEMPTS}, "$or": [
+                    {"status": JobStatus.QUEUED.value},
+                    # Claimed by a worker that stopped renewing its lease
+                    {"status": JobStatus.RUNNING.value, "lease_until": {"$lt": now}},
+                ]},
+                {"$set": {
+                    "status": JobStatus.RUNNING.value,
+                    "started_at": now,
+                    "worker": self.origin,
+                    "lease_until": now + JOB_LEASE,
+                }, "$inc": {"attempts": 1}},
+                sort=[("priority", -1), ("created_at", 1)],
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            if job:
+                self.running[JobType(job['type'])] += 1
+            return job
+
+    async def has_worker(self) -> bool:
+        if self.workers:
+            return True
+        seen_since = datetime.now(timezone.utc) - JOB_WORKER_STALE
+        return await self.db.job_workers.find_one({"seen_at": {"$gte": seen_since}}, {"_id": 1}) is not None
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await self.db.job_workers.update_one(
+                    {"_id": self.origin},
+                    {"$set": {"host": socket.gethostname(), "pid": os.getpid(), "workers": self.workers,
+                              "seen_at": datetime.now(timezone.utc)}},
+                    upsert=True,
+                )
+            except PyMongoError as e:
+                logger.warning("Could not record the job worker heartbeat: %s", e)
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+
+    async def _renew(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE.total_seconds() / 3)
+            await self.db.jobs.update_one(
+                {"id": job_id, "worker": self.origin},
+                {"$set": {"lease_until": datetime.now(timezone.utc) + JOB_LEASE}},
+            )
+
+    async def _store(self, job_id: str, output: StreamedFile) -> JobResultFile:
+        upload = self.files.open_upload_stream(
+            output.filename, metadata={"job_id": job_id, "media_type": output.media_type}
+        )
+        try:
+            async for chunk in output.chunks:
+                await upload.write(chunk)
+        except BaseException:
+            await upload.abort()
+            raise
+        await upload.close()
+        return JobResultFile(
+            file_id=str(upload._id), filename=output.filename, media_type=output.media_type, length=upload.length
+        )
+
+    async def _run(self, job: dict):
+        job_type = JobType(job['type'])
+        renew = asyncio.create_task(self._renew(job['id']))
+        update = {}
+        try:
+            output = await self.handlers[job_type](job['params'])
+            if isinstance(output, StreamedFile):
+                update["result_file"] = (await self._store(job['id'], output)).model_dump()
+            else:
+                update["result"] = output.model_dump() if isinstance(output, BaseModel) else output
+            update["status"] = JobStatus.SUCCEEDED.value
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job['id'], job_type.value)
+            update["status"] = JobStatus.FAILED.value
+            update["error"] = str(e.detail if isinstance(e, HTTPException) else e)
+        finally:
+            renew.cancel()
+            self.running[job_type] -= 1
+            self._wakeup.set()
+        update["finished_at"] = datetime.now(timezone.utc)
+        await self.db.jobs.update_one({"id": job['id'], "worker": self.origin}, {"$set": update})
+
+    async def _work(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except PyMongoError as e:
+                logger.warning("Could not claim a job: %s", e)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except PyMongoError as e:
+                logger.warning("Could not record the outcome of job %s: %s", job['id'], e)
+
+    async def _purge(self):
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                await self.db.jobs.update_many(
+                    {"status": JobStatus.RUNNING.value, "lease_until": {"$lt": now}, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+                    {"$set": {"status": JobStatus.FAILED.value, "error": "Worker lost on every attempt", "finished_at": now}},
+                )
+                async for job in self.db.jobs.find({"finished_at": {"$lt": now - JOB_RETENTION}}, {"_id": 0, "id": 1, "result_file": 1}):
+                    if job.get('result_file'):
+                        try:
+                            await self.files.delete(ObjectId(job['result_file']['file_id']))
+                        except NoFile:
+                            pass
+                    await self.db.jobs.delete_one({"id": job['id']})
+                await self.db.job_workers.delete_many({"seen_at": {"$lt": now - JOB_WORKER_STALE}})
+            except PyMongoError as e:
+                logger.warning("Job purge failed: %s", e)
+            await asyncio.sleep(3600)
+
+    async def start(self):
+        if not self.workers:
+            return
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge()))
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        # Running jobs keep their lease until it expires, then another worker reruns them
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._tasks:
+            try:
+                await self.db.job_workers.delete_one({"_id": self.origin})
+            except PyMongoError as e:
+                logger.warning("Could not remove the job worker heartbeat: %s", e)
+        self._tasks = []
+
+def upload_job(run_import):
+    async def handler(params: dict):
+        file_id = ObjectId(params['upload_id'])
+        with tempfile.SpooledTemporaryFile(max_size=JOB_SPOOL_BYTES) as spool:
+            await job_queue.files.download_to_stream(file_id, spool)
+            spool.seek(0)
+            upload = UploadFile(spool, filename=params['filename'], headers=Headers({"content-type": params['content_type'] or ""}))
+            try:
+                return await run_import(upload, ImportFormat(params['format']) if params['format'] else None)
+            finally:
+                await job_queue.files.delete(file_id)
+    return handler
+
+async def po_pdf_export_job(params: dict) -> StreamedFile:
+    return await po_pdf_export_file(POPdfExportRequest(**params))
+
+async def export_job(params: dict) -> StreamedFile:
+    return export_file(ExportDataset(params['dataset']), ExportFormat(params['format']), params['created_from'], params['created_to'])
+
+async def spend_rebuild_job(params: dict) -> dict:
+    return await run_spend_rebuild()
+
+async def scorecard_rebuild_job(params: dict) -> dict:
+    return await run_scorecard_rebuild()
+
+async def three_way_match_job(params: dict) -> MatchRunSummary:
+    return await run_three_way_match(**params)
+
+async def reorder_run_job(params: dict) -> ReorderRunSummary:
+    return await run_reorder(ReorderRunRequest(**params))
+
+job_queue = JobQueue(None, JOB_WORKERS, {
+    JobType.PO_PDF_EXPORT: po_pdf_export_job,
+    JobType.EXPORT: export_job,
+    JobType.ITEM_IMPORT: upload_job(run_item_import),
+    JobType.SUPPLIER_IMPORT: upload_job(run_supplier_import),
+    JobType.SPEND_REBUILD: spend_rebuild_job,
+    JobType.SCORECARD_REBUILD: scorecard_rebuild_job,
+    JobType.THREE_WAY_MATCH: three_way_match_job,
+    JobType.REORDER_RUN: reorder_run_job,
+})
+
+async def require_job_worker():
+    # Without a worker the job would sit in the queue until one starts
+    if not await job_queue.has_worker():
+        raise HTTPException(status_code=503, detail="No job worker is running; retry without background=true")
+
+async def submit_job(job_type: JobType, params: dict) -> Response:
+    job = await job_queue.submit(job_type, params)
+    return FastJSONResponse(job.model_dump(mode="json"), status_code=202, headers={"Location": f"/api/jobs/{job.id}"})
+
+async def enqueue_job(job_type: JobType, params: dict) -> Response:
+    await require_job_worker()
+    return await submit_job(job_type, params)
+
+async def enqueue_upload_job(job_type: JobType, upload: UploadFile, format: Optional[ImportFormat]) -> Response:
+    await require_job_worker()
+    # The upload is discarded when the request ends, so park it in GridFS for the job
+    file_id = await job_queue.files.upload_from_stream(upload.filename or "upload", upload.file)
+    return await submit_job(job_type, {
+        "upload_id": str(file_id),
+        "filename": upload.filename,
+        "content_type": upload.content_type,
+        "format": format.value if format else None,
+    })
+
+@api_router.get("/jobs", response_model=List[Job])
+async def get_jobs(
+    status: Optional[JobStatus] = Query(None),
+    type: Optional[JobType] = Query(None),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+):
+    query = {}
+    if status:
+        query["status"] = status.value
+    if type:
+        query["type"] = type.value
+    return await db.jobs.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0, "status": 1, "result": 1, "result_file": 1})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] != JobStatus.SUCCEEDED.value:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    if not job.get('result_file'):
+        return job.get('result')
+    result_file = JobResultFile(**job['result_file'])
+    download = await job_queue.files.open_download_stream(ObjectId(result_file.file_id))
+
+    async def chunks():
+        while chunk := await download.readchunk():
+            yield chunk
+
+    return file_response(StreamedFile(result_file.filename, result_file.media_type, chunks()))
+
+# Admin Routes
+@api_router.post("/admin/counters/backfill")
+async def backfill_counters():
+    seeded = await sequences.backfill()
+    return {"message": "Counters seeded", "counters": seeded}
+
+@api_router.get("/admin/query-plans")
+async def get_query_plans():
+    plans = await audit_query_plans(db)
+    collscans = [p['route'] for p in plans if p['collscan']]
+    return {"ok": not collscans, "collscans": collscans, "plans": plans}
+
+@api_router.post("/admin/migrations/native-dates")
+async def run_native_dates_migration(batch_size: int = Query(500, ge=1, le=10000)):
+    converted = await migrate_native_dates(db, batch_size)
+    return {"message": "Dates migrated", "converted": converted}
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Dashboard Stats
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats():
-    total_suppliers = await db.suppliers.count_documents({})
-    total_items = await db.items.count_documents({})
-    total_pos = await db.purchase_orders.count_documents({})
-    pending_approvals = await db.purchase_orders.count_documents({"status": "pending"})
-    low_stock_count = len([i for i in await db.items.find({}, {"_id": 0}).to_list(1000) if i.get('quantity', 0) <= i.get('reorder_level', 0)])
-    
-    # Recent POs for chart
-    recent_pos = await db.purchase_orders.find({}, {"_id": 0}).sort("created_at", -1).limit(30).to_list(30)
-    
+RECENT_ACTIVITY_WINDOW = 30
+dashboard_cache = TTLCache(ttl=float(os.environ.get('DASHBOARD_CACHE_TTL', '10')), maxsize=1)
+dashboard_lock = asyncio.Lock()
+
+def invalidate_dashboard():
+    dashboard_cache.invalidate()
+
+async def compute_dashboard_stats() -> dict:
+    po_stats_pipeline = [
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "pending": [{"$match": {"status": ApprovalStatus.PENDING.value}}, {"$count": "n"}],
+        }},
+    ]
+    total_suppliers, total_items, low_stock_count, po_stats = await asyncio.gather(
+        db.suppliers.estimated_document_count(),
+        db.items.estimated_document_count(),
+        db.items.count_documents({"is_low_stock": True}),
+        db.purchase_orders.aggregate(po_stats_pipeline).to_list(1),
+    )
+    facets = po_stats[0] if po_stats else {}
+    total_pos = facets['total'][0]['n'] if facets.get('total') else 0
+    pending_approvals = facets['pending'][0]['n'] if facets.get('pending') else 0
     return {
         "total_suppliers": total_suppliers,
         "total_items": total_items,
         "total_pos": total_pos,
         "pending_approvals": pending_approvals,
         "low_stock_count": low_stock_count,
-        "recent_activity": len(recent_pos)
+        "recent_activity": min(total_pos, RECENT_ACTIVITY_WINDOW)
     }
 
-app.include_router(api_router)
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats():
+    stats = dashboard_cache.get("stats")
+    if stats is not None:
+        return stats
+    # Coalesce concurrent misses into a single computation
+    async with dashboard_lock:
+        stats = dashboard_cache.get("stats")
+        if stats is None:
+            stats = await compute_dashboard_stats()
+            dashboard_cache.set("stats", stats)
+    return stats
+
+# Health Routes
+# Liveness only reports that the process serves requests. Readiness fails until
+# startup has finished warming, when Mongo doesn't answer a ping, and while the
+# pool is exhausted with check-outs queued behind it.
+READY_PING_TIMEOUT = float(os.environ.get('READY_PING_TIMEOUT', '2'))
+startup_complete = asyncio.Event()
+
+def pool_saturation() -> List[dict]:
+    max_size = client.options.pool_options.max_pool_size
+    return [
+        {"address": address, **pool, "max_size": max_size,
+         "saturation": round(pool['in_use'] / max_size, 3) if max_size else None}
+        for address, pool in sorted(metrics.pool_stats().items())
+    ]
+
+@api_router.get("/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    # Sampled before the ping, which itself waits on an exhausted pool
+    pools = pool_saturation()
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), READY_PING_TIMEOUT)
+        reachable = True
+    except (PyMongoError, asyncio.TimeoutError):
+        reachable = False
+    saturated = any(pool['waiting'] > 0 and (pool['saturation'] or 0) >= 1 for pool in pools)
+    ready = startup_complete.is_set() and reachable and not saturated
+    return FastJSONResponse({
+        "ready": ready,
+        "started": startup_complete.is_set(),
+        "mongo_reachable": reachable,
+        "pool_saturated": saturated,
+        "pools": pools,
+    }, status_code=200 if ready else 503)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def warm_pool(size: int):
+    # Concurrent pings each hold a connection, so the pool opens up to size of them
+    max_size = client.options.pool_options.max_pool_size
+    size = min(size, max_size) if max_size else size
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(size)))
+
+def connect_database():
+    global client, db
+    client = AsyncIOMotorClient(
+        os.environ['MONGO_URL'],
+        tz_aware=True,
+        event_listeners=[MongoCommandListener(metrics), MongoPoolListener(metrics)],
+        **mongo_client_options(),
+    )
+    db = client[os.environ['DB_NAME']]
+    # Module-level services are created before the database exists
+    sequences.db = db
+    lookup_cache.db = db
+    job_queue.db = db
+    job_queue._files = None
+
+async def startup_db():
+    connect_database()
+    if 'JWT_SECRET' not in os.environ:
+        logger.warning("JWT_SECRET is not set; tokens will not verify across workers or restarts")
+    await warm_pool(MONGO_WARM_CONNECTIONS)
+    await dummy_password_hash()
+    await sequences.backfill(only_missing=True)
+    await renumber_duplicates(db)
+    await ensure_indexes(db)
+    # Keyset cursors and created_at filters compare against native dates, so
+    # string dates from older releases must be converted before serving. The
+    # migration resumes from its checkpoint if a previous start was cut short.
+    if not (await db.migrations.find_one({"_id": DATE_MIGRATION_ID}, {"completed_at": 1}) or {}).get('completed_at'):
+        await migrate_native_dates(db)
+    # Items written before stock status was maintained
+    await db.items.update_many({"is_low_stock": {"$exists": False}}, [STOCK_STATUS_STAGE])
+    # Suppliers written while rating was a constant
+    if await db.suppliers.find_one({"scorecard": {"$exists": False}}, {"_id": 1}):
+        try:
+            await rebuild_supplier_scorecards()
+        except HTTPException:
+            logger.info("Another process is rebuilding supplier scorecards")
+    for kind in SearchKind:
+        await search_index.load(db, kind)
+    await warm_queries(db, MONGO_WARM_DOCS)
+    if not job_queue.workers:
+        lookup_cache.broadcast = True
+    await lookup_cache.start()
+    await job_queue.start()
+
+async def shutdown_db_client():
+    await job_queue.stop()
+    await lookup_cache.stop()
+    pdf_renderer.shutdown()
+    auth_executor.shutdown(wait=False)
+    client.close()
+
+# Response compression
+# Everything but PDFs, ZIP archives and XLSX files is gzipped (JSON, NDJSON, CSV
+# exports, the metrics text). Those three are already deflated, and compressing
+# them again only burns event-loop time.
+GZIP_SKIPPED_MEDIA_TYPES = {
+    "application/pdf",
+    "application/zip",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+class SelectiveGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message):
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            media_type = Headers(raw=message["headers"]).get("content-type", "").split(";")[0].strip()
+            if media_type in GZIP_SKIPPED_MEDIA_TYPES:
+                # Passed through as if it were already encoded
+                self.content_encoding_set = True
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = SelectiveGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup_db()
+    startup_complete.set()
+    try:
+        yield
+    finally:
+        startup_complete.clear()
+        await shutdown_db_client()
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(api_router, dependencies=[Depends(enforce_auth)])
 
 app.add_middleware(
     CORSMiddleware,
@@ -590,14 +3807,9 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=int(os.environ.get('GZIP_MIN_SIZE', '1024')))
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+app.add_middleware(MetricsMiddleware)
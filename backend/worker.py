@@ -0,0 +1,44 @@
+"""Background job worker for the PMS API.
+
+Runs the job queue in its own process, so batch jobs (exports, imports,
+rebuilds, matching) never share an event loop with HTTP requests. Start one
+or more of these next to the web processes with the same .env (see
+worker.supervisord.conf), then set JOB_WORKERS=0 for the web processes so
+they only enqueue.
+
+    python worker.py --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+
+import server
+
+
+async def run(concurrency):
+    server.job_queue.workers = concurrency
+    # Imports run here, so web processes only see their evictions through the feed
+    server.lookup_cache.broadcast = True
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await server.startup_db()
+    server.logger.info("Job worker running %d tasks", concurrency)
+    try:
+        await stop.wait()
+    finally:
+        await server.shutdown_db_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get('JOB_WORKER_CONCURRENCY', '2')),
+                        help="Jobs run at once, within the per-type limits")
+    args = parser.parse_args()
+    asyncio.run(run(max(1, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Tests that need MongoDB use their own database on TEST_MONGO_URL and are
+# skipped when it isn't set.
+TEST_MONGO_URL = os.environ.get('TEST_MONGO_URL')
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('MONGO_WARM_CONNECTIONS', '2')
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from tests.helpers import line  # noqa: E402
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """A TestClient on a throwaway database, with the lifespan run against it."""
+    if not TEST_MONGO_URL:
+        pytest.skip("TEST_MONGO_URL is not set")
+    name = f"pms_test_{uuid.uuid4().hex[:12]}"
+    monkeypatch.setenv('MONGO_URL', TEST_MONGO_URL)
+    monkeypatch.setenv('DB_NAME', name)
+    monkeypatch.setenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '2000')
+
+    # In-memory state from earlier tests; the lifespan binds these to the new database
+    monkeypatch.setattr(server, "sequences", server.SequenceCounter(None))
+    monkeypatch.setattr(server, "search_index", server.PrefixIndex())
+    lookup_cache = server.DocumentCache(
+        None, server.LOOKUP_CACHE_COLLECTIONS, server.LOOKUP_CACHE_TTL, server.LOOKUP_CACHE_SIZE
+    )
+    lookup_cache.listeners.append(server.refresh_search_index)
+    monkeypatch.setattr(server, "lookup_cache", lookup_cache)
+    # Shut down by the lifespan on exit, so each test gets its own
+    monkeypatch.setattr(server, "auth_executor", ThreadPoolExecutor(max_workers=2))
+    server.session_cache.invalidate()
+    server.dashboard_cache.invalidate()
+
+    with TestClient(server.app) as test_client:
+        yield test_client
+        test_client.portal.call(server.client.drop_database, name)
+
+
+@pytest.fixture
+def supplier(api):
+    response = api.post("/api/suppliers", json={"name": "Acme Supplies", "tax_id": "ACME-1", "email": "sales@acme.example.com"})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.fixture
+def items(api, supplier):
+    created = []
+    for i, (quantity, reorder_level) in enumerate([(50, 10), (5, 10), (0, 20)]):
+        response = api.post("/api/items", json={
+            "name": f"Widget {i}", "sku": f"WID-{i}", "category": "Hardware", "unit_price": 10.0 + i,
+            "quantity": quantity, "reorder_level": reorder_level, "supplier_id": supplier['id'],
+        })
+        assert response.status_code == 200
+        created.append(response.json())
+    return created
+
+
+@pytest.fixture
+def purchase_order(api, supplier, items):
+    response = api.post("/api/purchase-orders", json={
+        "supplier_id": supplier['id'], "supplier_name": supplier['name'],
+        "items": [line(items[0], 10), line(items[1], 4)], "created_by": "tester",
+    })
+    assert response.status_code == 200
+    return response.json()
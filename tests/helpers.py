@@ -0,0 +1,20 @@
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def assert_matches_model(model, docs):
+    # The same check RESPONSE_SCHEMA_CHECK runs on fast-path pages
+    try:
+        server.check_documents(model, docs)
+    except HTTPException:
+        pytest.fail(f"{len(docs)} documents do not match {model.__name__}")
+
+
+def line(item, quantity, unit_price=None):
+    unit_price = item['unit_price'] if unit_price is None else unit_price
+    return {
+        "item_id": item['id'], "item_name": item['name'],
+        "quantity": quantity, "unit_price": unit_price, "total": quantity * unit_price,
+    }
@@ -0,0 +1,76 @@
+import asyncio
+
+import server
+from tests.helpers import line
+
+
+def approved_spend(api, supplier_id):
+    rows = api.portal.call(lambda: server.db.spend_rollups.find({"supplier_id": supplier_id}).to_list(None))
+    return sum(row.get('approved_amount', 0) for row in rows)
+
+
+def test_two_level_po_books_approved_spend_once(api, supplier, items):
+    response = api.post("/api/purchase-orders", json={
+        "supplier_id": supplier['id'], "supplier_name": supplier['name'],
+        "items": [line(items[0], 1001)], "created_by": "tester",
+    })
+    po = response.json()
+    assert po['total_amount'] > server.TWO_LEVEL_APPROVAL_THRESHOLD
+
+    async def approve_concurrently():
+        return await asyncio.gather(*(server.apply_approval(po['id'], f"approver-{i}") for i in range(6)))
+
+    # Two levels approve it; the approvals that arrive after that are refused
+    results = [result for result in api.portal.call(approve_concurrently) if result]
+    assert sorted(result['approval_level'] for result in results) == [1, 2]
+    assert sum(server.became_approved(result) for result in results) == 1
+    assert approved_spend(api, supplier['id']) == po['total_amount']
+
+    stored = api.get(f"/api/purchase-orders/{po['id']}").json()
+    assert stored['status'] == "approved"
+    assert len(stored['approved_by']) == 2
+
+
+def test_same_approver_counts_once(api, supplier, purchase_order):
+    first = api.put(f"/api/purchase-orders/{purchase_order['id']}/approve", params={"approver_id": "a1"})
+    again = api.put(f"/api/purchase-orders/{purchase_order['id']}/approve", params={"approver_id": "a1"})
+    assert first.json() == {"message": "PO approved", "status": "approved"}
+    assert again.json() == {"message": "PO already approved by this approver", "status": "approved"}
+    assert approved_spend(api, supplier['id']) == purchase_order['total_amount']
+
+
+def test_batch_labels_each_po(api, purchase_order):
+    api.put(f"/api/purchase-orders/{purchase_order['id']}/approve", params={"approver_id": "a1"})
+    response = api.post("/api/purchase-orders/approve", json={
+        "po_ids": [purchase_order['id'], "missing"], "approver_id": "a1",
+    })
+    assert response.json() == [
+        {"po_id": purchase_order['id'], "result": "already_approved", "status": "approved"},
+        {"po_id": "missing", "result": "not_found", "status": None},
+    ]
+
+
+
+def test_settled_pos_are_not_reopened(api, supplier, purchase_order):
+    api.portal.call(server.db.purchase_orders.update_one, {"id": purchase_order['id']}, {"$set": {"status": "rejected"}})
+    response = api.put(f"/api/purchase-orders/{purchase_order['id']}/approve", params={"approver_id": "a1"})
+    assert (response.status_code, response.json()['detail']) == (409, "PO is rejected and can't be approved")
+    response = api.post("/api/purchase-orders/approve", json={"po_ids": [purchase_order['id']], "approver_id": "a1"})
+    assert response.json() == [{"po_id": purchase_order['id'], "result": "not_approvable", "status": "rejected"}]
+    stored = api.get(f"/api/purchase-orders/{purchase_order['id']}").json()
+    assert (stored['status'], stored['approval_level'], stored['approved_by']) == ("rejected", 0, [])
+    assert approved_spend(api, supplier['id']) == 0
+
+
+def test_approved_po_takes_no_further_approvals(api, purchase_order):
+    api.put(f"/api/purchase-orders/{purchase_order['id']}/approve", params={"approver_id": "a1"})
+    response = api.post("/api/purchase-orders/approve", json={"po_ids": [purchase_order['id']], "approver_id": "a2"})
+    assert response.json() == [{"po_id": purchase_order['id'], "result": "not_approvable", "status": "approved"}]
+    assert api.get(f"/api/purchase-orders/{purchase_order['id']}").json()['approved_by'] == ["a1"]
+
+
+def test_skipped_approval_result():
+    assert server.skipped_approval_result(None, "a1") == "not_found"
+    assert server.skipped_approval_result({"status": "pending", "approved_by": ["a1"]}, "a1") == "already_approved"
+    assert server.skipped_approval_result({"status": "approved", "approved_by": ["a1"]}, "a1") == "already_approved"
+    assert server.skipped_approval_result({"status": "rejected", "approved_by": []}, "a1") == "not_approvable"
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+
+
+def add_user(api, user_id, **fields):
+    # Stored the way accounts from before password hashing look
+    user = {"id": user_id, "email": f"{user_id}@example.com", "name": "Legacy", "role": "purchaser"}
+    api.portal.call(server.db.users.insert_one, {**user, **fields})
+    return user
+
+
+def login(api, email, password):
+    return api.post("/api/auth/login", json={"email": email, "password": password})
+
+
+def test_empty_passwords_are_rejected_by_the_model(api):
+    assert login(api, "someone@example.com", "").status_code == 422
+    response = api.post("/api/auth/register", json={"email": "new@example.com", "name": "New", "role": "purchaser", "password": ""})
+    assert response.status_code == 422
+
+
+def test_account_without_a_stored_password_cannot_log_in(api):
+    user = add_user(api, "u1")
+    assert login(api, user['email'], "anything").status_code == 401
+    api.portal.call(server.db.users.update_one, {"id": "u1"}, {"$set": {"password": ""}})
+    assert login(api, user['email'], "anything").status_code == 401
+    assert "password_hash" not in api.portal.call(server.db.users.find_one, {"id": "u1"})
+
+
+def test_legacy_plaintext_password_is_upgraded(api):
+    user = add_user(api, "u2", password="s3cret")
+    assert login(api, user['email'], "wrong").status_code == 401
+    assert login(api, user['email'], "s3cret").status_code == 200
+    stored = api.portal.call(server.db.users.find_one, {"id": "u2"})
+    assert "password" not in stored and stored['password_hash'].startswith("$2")
+    assert login(api, user['email'], "s3cret").status_code == 200
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    cache = server.TTLCache(ttl=60, maxsize=10)
+    monkeypatch.setattr(server, "session_cache", cache)
+    return cache
+
+
+def bearer(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def authenticate(credentials):
+    return asyncio.run(server.current_user(credentials))
+
+
+def test_issued_token_carries_the_user_and_is_served_from_the_session_cache(sessions):
+    user = {"id": "u1", "email": "u1@example.com", "name": "User", "role": "purchaser"}
+    token = server.issue_token(user)
+    claims = jwt.decode(token, server.JWT_SECRET, algorithms=[server.JWT_ALGORITHM])
+    assert claims['sub'] == "u1"
+    assert claims['exp'] - claims['iat'] == server.TOKEN_TTL.total_seconds()
+    # Cached, so no database read is needed
+    assert authenticate(bearer(token)) == user
+
+
+@pytest.mark.parametrize("credentials", [None, bearer("not-a-jwt")])
+def test_missing_or_malformed_token_is_a_401(sessions, credentials):
+    with pytest.raises(HTTPException) as exc:
+        authenticate(credentials)
+    assert exc.value.status_code == 401
+    assert exc.value.headers == {"WWW-Authenticate": "Bearer"}
+
+
+def test_expired_token_is_a_401_and_leaves_the_cache(sessions):
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    token = jwt.encode({"sub": "u1", "iat": past - timedelta(hours=1), "exp": past}, server.JWT_SECRET, algorithm=server.JWT_ALGORITHM)
+    sessions.set(token, (past.timestamp(), {"id": "u1"}))
+    with pytest.raises(HTTPException) as exc:
+        authenticate(bearer(token))
+    assert exc.value.status_code == 401
+    assert sessions.get(token) is None
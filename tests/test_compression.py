@@ -0,0 +1,40 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import server
+
+BODY = b"0123456789abcdef" * 256
+
+
+def respond(media_type):
+    async def endpoint(request):
+        return Response(BODY, media_type=media_type)
+    return endpoint
+
+
+MEDIA_TYPES = [
+    ("application/json", True),
+    ("application/x-ndjson", True),
+    ("text/csv; charset=utf-8", True),
+    ("text/plain; version=0.0.4", True),
+    ("application/pdf", False),
+    ("application/zip", False),
+    ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", False),
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = Starlette(routes=[Route(f"/{i}", respond(media_type)) for i, (media_type, _) in enumerate(MEDIA_TYPES)])
+    app.add_middleware(server.SelectiveGZipMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("index,media_type,gzipped", [(i, *case) for i, case in enumerate(MEDIA_TYPES)])
+def test_only_already_compressed_types_skip_gzip(client, index, media_type, gzipped):
+    response = client.get(f"/{index}", headers={"Accept-Encoding": "gzip"})
+    assert (response.headers.get("content-encoding") == "gzip") == gzipped
+    assert response.content == BODY
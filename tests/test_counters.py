@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timezone
+
+import server
+
+
+def test_concurrent_numbers_are_unique_and_contiguous(api):
+    async def issue():
+        return await asyncio.gather(*(server.sequences.next_number("po") for _ in range(50)))
+
+    numbers = api.portal.call(issue)
+    assert sorted(numbers) == [f"PO-{i:05d}" for i in range(1, 51)]
+
+
+def test_leased_numbers_are_unique(api):
+    counter = server.SequenceCounter(server.db, lease_size=8)
+
+    async def issue():
+        return await asyncio.gather(*(counter.next_value("gr") for _ in range(20)))
+
+    values = api.portal.call(issue)
+    assert sorted(values) == list(range(1, 21))
+    # Three leases of 8 cover 20 values
+    counter_doc = api.portal.call(server.db.counters.find_one, {"_id": "gr"})
+    assert counter_doc['seq'] == 24
+
+
+def test_next_numbers_reserves_a_block(api):
+    api.portal.call(server.sequences.next_number, "invoice")
+    assert api.portal.call(server.sequences.next_numbers, "invoice", 3) == ["INV-00002", "INV-00003", "INV-00004"]
+    assert api.portal.call(server.sequences.next_numbers, "invoice", 0) == []
+
+
+def test_backfill_starts_after_the_highest_number(api, purchase_order):
+    api.portal.call(server.db.purchase_orders.insert_one, {"id": "legacy", "po_number": "PO-00042"})
+    api.portal.call(server.db.counters.delete_many, {})
+    seeded = api.portal.call(server.sequences.backfill)
+    assert seeded['po'] == 42
+    assert api.portal.call(server.sequences.next_number, "po") == "PO-00043"
+    # $max never moves a counter backwards
+    api.portal.call(server.db.purchase_orders.delete_one, {"id": "legacy"})
+    api.portal.call(server.sequences.backfill)
+    assert api.portal.call(server.sequences.next_number, "po") == "PO-00044"
+
+
+def test_duplicate_numbers_are_renumbered_before_indexing(api, supplier, purchase_order):
+    api.portal.call(server.db.purchase_orders.drop_index, "po_number_1")
+    duplicate = {**purchase_order, "id": "copy", "created_at": datetime.now(timezone.utc)}
+    api.portal.call(server.db.purchase_orders.insert_one, duplicate)
+    api.portal.call(server.db.goods_receipts.insert_one, {"id": "gr", "po_id": "copy", "po_number": purchase_order['po_number']})
+
+    renumbered = api.portal.call(server.renumber_duplicates, server.db)
+    assert renumbered == [{
+        "collection": "purchase_orders", "id": "copy", "number": "PO-00002", "renumbered_from": purchase_order['po_number'],
+    }]
+    assert api.portal.call(server.db.purchase_orders.find_one, {"id": purchase_order['id']})['po_number'] == purchase_order['po_number']
+    assert api.portal.call(server.db.goods_receipts.find_one, {"id": "gr"})['po_number'] == "PO-00002"
+
+    api.portal.call(server.ensure_indexes, server.db)
+    assert api.portal.call(server.has_unique_index, server.db.purchase_orders, "po_number")
+    assert api.portal.call(server.renumber_duplicates, server.db) == []
@@ -0,0 +1,53 @@
+import asyncio
+import csv
+import io
+import zipfile
+from datetime import datetime, timezone
+from xml.etree import ElementTree
+
+import server
+
+NS = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+async def batches(*rows_per_batch):
+    for rows in rows_per_batch:
+        yield rows
+
+
+def collect(chunks) -> bytes:
+    async def read():
+        return b"".join([chunk async for chunk in chunks])
+    return asyncio.run(read())
+
+
+def test_xlsx_row_cells():
+    assert server.xlsx_row([1, 2.5, None, True, "a<b & c", "bell\x07"]) == (
+        '<row><c><v>1</v></c><c><v>2.5</v></c><c/>'
+        '<c t="inlineStr"><is><t>True</t></is></c>'
+        '<c t="inlineStr"><is><t>a&lt;b &amp; c</t></is></c>'
+        '<c t="inlineStr"><is><t>bell</t></is></c></row>'
+    )
+
+
+def test_stream_xlsx_is_a_readable_workbook():
+    data = collect(server.stream_xlsx(["po_number", "quantity"], batches([["PO-00001", 3]], [["PO-00002", None]])))
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert set(server.XLSX_STATIC_PARTS) < set(archive.namelist())
+        sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+    rows = [
+        [cell.findtext("s:v", namespaces=NS) or cell.findtext("s:is/s:t", namespaces=NS) for cell in row]
+        for row in sheet.iterfind("s:sheetData/s:row", NS)
+    ]
+    assert rows == [["po_number", "quantity"], ["PO-00001", "3"], ["PO-00002", None]]
+
+
+def test_stream_csv():
+    data = collect(server.stream_csv(["po_number", "item_name"], batches([["PO-00001", 'Bolt, "M6"']], [])))
+    assert list(csv.reader(io.StringIO(data.decode()))) == [["po_number", "item_name"], ["PO-00001", 'Bolt, "M6"']]
+
+
+def test_export_value():
+    assert server.export_value(datetime(2024, 5, 1, tzinfo=timezone.utc)) == "2024-05-01T00:00:00+00:00"
+    assert server.export_value(server.ApprovalStatus.APPROVED) == "approved"
+    assert server.export_value(12.5) == 12.5
@@ -0,0 +1,47 @@
+from tests.helpers import line
+
+
+def stock(api, item):
+    return api.get(f"/api/items/{item['id']}").json()
+
+
+def test_line_results_and_stock(api, items, purchase_order):
+    unknown = {**items[0], "id": "unknown", "name": "Unknown"}
+    response = api.post("/api/goods-receipts", json={
+        "po_id": purchase_order['id'], "received_by": "u1",
+        "items": [line(items[0], 10), line(unknown, 3), line(items[1], 4)],
+    })
+    assert response.status_code == 200
+    receipt = response.json()
+    assert receipt['gr_number'] == "GR-00001"
+    assert [(r['line'], r['status'], r['detail']) for r in receipt['line_results']] == [
+        (0, "received", None), (1, "rejected", "Item not found"), (2, "received", None),
+    ]
+    assert [i['item_id'] for i in receipt['items']] == [items[0]['id'], items[1]['id']]
+
+    assert stock(api, items[0])['quantity'] == 60
+    low = stock(api, items[1])
+    assert (low['quantity'], low['is_low_stock'], low['shortfall']) == (9, True, 1)
+
+
+def test_receipt_errors(api, items, purchase_order):
+    unknown = {**items[0], "id": "unknown", "name": "Unknown"}
+    response = api.post("/api/goods-receipts", json={"po_id": purchase_order['id'], "received_by": "u1", "items": [line(unknown, 1)]})
+    assert (response.status_code, response.json()['detail']) == (400, "No receivable lines")
+    response = api.post("/api/goods-receipts", json={"po_id": "missing", "received_by": "u1", "items": [line(items[0], 1)]})
+    assert (response.status_code, response.json()['detail']) == (404, "PO not found")
+    assert stock(api, items[0])['quantity'] == 50
+
+
+def test_batch_keeps_going_past_a_failed_entry(api, items, purchase_order):
+    response = api.post("/api/goods-receipts/batch", json=[
+        {"po_id": purchase_order['id'], "received_by": "u1", "items": [line(items[0], 2)]},
+        {"po_id": "missing", "received_by": "u1", "items": [line(items[0], 100)]},
+        {"po_id": purchase_order['id'], "received_by": "u1", "items": [line(items[0], 3)]},
+    ])
+    results = response.json()
+    assert [(r['index'], r['status'], r['detail']) for r in results] == [
+        (0, "created", None), (1, "failed", "PO not found"), (2, "created", None),
+    ]
+    assert [results[0]['receipt']['gr_number'], results[2]['receipt']['gr_number']] == ["GR-00001", "GR-00002"]
+    assert stock(api, items[0])['quantity'] == 55
@@ -0,0 +1,42 @@
+import server
+
+
+def import_csv(api, path, text):
+    response = api.post(path, files={"file": ("rows.csv", text, "text/csv")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def stored_item(api, sku):
+    return api.portal.call(server.db.items.find_one, {"sku": sku}, {"_id": 0})
+
+
+def test_reimport_keeps_columns_the_file_leaves_out(api, items):
+    api.put(f"/api/items/{items[0]['id']}", json={
+        "name": items[0]['name'], "sku": "WID-0", "category": "Hardware", "unit_price": 10.0,
+        "quantity": 50, "reorder_level": 10, "description": "Keep me",
+    })
+    result = import_csv(api, "/api/items/import", "sku,name,category,unit_price,reorder_level\nWID-0,Widget 0,Hardware,12.5,60\n")
+    assert (result['inserted'], result['updated'], result['failed']) == (0, 1, 0)
+
+    item = stored_item(api, "WID-0")
+    assert item['id'] == items[0]['id']
+    assert (item['unit_price'], item['quantity'], item['description']) == (12.5, 50, "Keep me")
+    # Stock status follows the new reorder level
+    assert (item['reorder_level'], item['is_low_stock'], item['shortfall']) == (60, True, 10)
+
+
+def test_new_rows_get_defaults(api):
+    result = import_csv(api, "/api/items/import", "sku,name,category,unit_price\nNEW-1,New,Hardware,3\n")
+    assert result['inserted'] == 1
+    item = stored_item(api, "NEW-1")
+    assert (item['quantity'], item['reorder_level'], item['unit'], item['is_low_stock'], item['shortfall']) == (0, 10, "pcs", True, 10)
+    assert item['id'] and item['created_at']
+
+
+def test_suppliers_upsert_on_tax_id(api, supplier):
+    result = import_csv(api, "/api/suppliers/import", "name,tax_id,city\nAcme Renamed,ACME-1,Oslo\nOther,,Bergen\n")
+    assert (result['inserted'], result['updated']) == (1, 1)
+    stored = api.get(f"/api/suppliers/{supplier['id']}").json()
+    assert (stored['name'], stored['city'], stored['email']) == ("Acme Renamed", "Oslo", "sales@acme.example.com")
+    assert api.post("/api/suppliers", json={"name": "Copy", "tax_id": "ACME-1"}).status_code == 400
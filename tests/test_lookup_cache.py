@@ -0,0 +1,79 @@
+import asyncio
+
+import server
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = {doc['id']: doc for doc in docs}
+        self.queried = []
+        self.before_yield = None
+
+    def find(self, query, projection):
+        ids = query["id"]["$in"]
+        self.queried.append(ids)
+
+        async def rows():
+            for doc_id in ids:
+                if doc_id in self.docs:
+                    if self.before_yield:
+                        await self.before_yield()
+                    yield dict(self.docs[doc_id])
+        return rows()
+
+
+def make_cache(docs):
+    items = FakeCollection(docs)
+    cache = server.DocumentCache({"items": items}, ["items"], ttl=60, maxsize=100)
+    return cache, items
+
+
+def test_reads_through_and_only_queries_misses():
+    cache, items = make_cache([{"id": "a", "name": "A"}, {"id": "b", "name": "B"}])
+    assert asyncio.run(cache.get("items", "a")) == {"id": "a", "name": "A"}
+    found = asyncio.run(cache.get_many("items", ["a", "b", "missing", "b"]))
+    assert found == {"a": {"id": "a", "name": "A"}, "b": {"id": "b", "name": "B"}}
+    assert items.queried == [["a"], ["b", "missing"]]
+
+
+def test_invalidate_evicts_ids_or_everything():
+    cache, items = make_cache([{"id": "a", "name": "A"}, {"id": "b", "name": "B"}])
+
+    async def run():
+        await cache.get_many("items", ["a", "b"])
+        items.docs["a"]["name"] = "A2"
+        await cache.invalidate("items", ["a"])
+        first = await cache.get_many("items", ["a", "b"])
+        await cache.invalidate("items")
+        await cache.get_many("items", ["a", "b"])
+        return first
+
+    assert asyncio.run(run())["a"]["name"] == "A2"
+    assert items.queried == [["a", "b"], ["a"], ["a", "b"]]
+
+
+def test_read_racing_an_eviction_is_not_cached():
+    cache, items = make_cache([{"id": "a", "name": "A"}])
+
+    async def run():
+        async def evict():
+            items.before_yield = None
+            await cache.invalidate("items", ["a"])
+        items.before_yield = evict
+        await cache.get("items", "a")
+        await cache.get("items", "a")
+
+    asyncio.run(run())
+    assert items.queried == [["a"], ["a"]]
+
+
+def test_evictions_from_other_workers_reach_listeners():
+    cache, _ = make_cache([])
+    seen = []
+
+    async def listener(collection, ids):
+        seen.append((collection, ids))
+
+    cache.listeners.append(listener)
+    asyncio.run(cache._notify("items", ["a"]))
+    assert seen == [("items", ["a"])]
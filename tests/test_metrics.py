@@ -0,0 +1,37 @@
+import server
+
+
+def test_render_emits_prometheus_text():
+    registry = server.MetricsRegistry()
+    registry.observe_request("GET", "/api/items", 200, 0.004)
+    registry.observe_request("GET", "/api/items", 200, 0.2)
+    registry.observe_command("items", "find", 0.002, failed=False)
+    registry.observe_command("items", "find", 0.002, failed=True)
+    registry.observe_cache("items", hits=3, misses=1, entries=4)
+    registry.observe_pool("db:27017", open=2, in_use=1)
+    registry.observe_checkout_failure("db:27017", "timeout")
+    lines = registry.render().splitlines()
+
+    assert 'http_requests_total{method="GET",route="/api/items",status="200"} 2' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/items",le="0.005"} 1' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/items",le="0.25"} 2' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/items",le="+Inf"} 2' in lines
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/items"} 2' in lines
+    assert 'mongo_command_duration_seconds_count{collection="items",command="find"} 2' in lines
+    assert 'mongo_command_failures_total{collection="items",command="find"} 1' in lines
+    assert 'cache_lookups_total{cache="items",result="hit"} 3' in lines
+    assert 'cache_lookups_total{cache="items",result="miss"} 1' in lines
+    assert 'cache_entries{cache="items"} 4' in lines
+    assert 'mongo_pool_connections{address="db:27017",state="open"} 2' in lines
+    assert 'mongo_pool_connections{address="db:27017",state="in_use"} 1' in lines
+    assert 'mongo_pool_connections{address="db:27017",state="waiting"} 0' in lines
+    assert 'mongo_pool_checkout_failures_total{address="db:27017",reason="timeout"} 1' in lines
+    # Every series is declared before its samples
+    names = [line.split()[2] for line in lines if line.startswith("# TYPE")]
+    for line in lines:
+        if not line.startswith("#"):
+            assert any(line.startswith(name) for name in names), line
+
+
+def test_label_values_are_escaped():
+    assert server.prometheus_labels(route='/a"b\\c\nd') == '{route="/a\\"b\\\\c\\nd"}'
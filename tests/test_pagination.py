@@ -0,0 +1,64 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from tests.helpers import assert_matches_model
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 3, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+    cursor = server.encode_cursor({"id": "abc", "created_at": created_at})
+    assert server.decode_cursor(cursor) == (created_at, "abc")
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm90IGpzb24", server.encode_cursor({"id": "x", "created_at": None})])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        server.decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_keyset_query_keeps_the_filter():
+    created_at = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    after = server.encode_cursor({"id": "abc", "created_at": created_at})
+    query = server.keyset_query({"status": "draft"}, after)
+    assert query == {"$and": [
+        {"status": "draft"},
+        {"$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "id": {"$gt": "abc"}},
+        ]},
+    ]}
+    assert server.keyset_query({"status": "draft"}, None) == {"status": "draft"}
+
+
+def test_pages_return_every_row_once(api, monkeypatch):
+    monkeypatch.setattr(server, "FAST_LIST_RESPONSES", True)
+    for i in range(7):
+        api.post("/api/items", json={"name": f"Bolt {i}", "sku": f"BOLT-{i}", "category": "Fasteners", "unit_price": 1})
+
+    seen, after = [], None
+    while True:
+        params = {"limit": 3, **({"after": after} if after else {})}
+        response = api.get("/api/items", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert_matches_model(server.Item, page)
+        seen += [item['sku'] for item in page]
+        after = response.headers.get("x-next-cursor")
+        if not after:
+            break
+    assert sorted(seen) == [f"BOLT-{i}" for i in range(7)]
+
+
+def test_ndjson_streams_the_same_rows(api):
+    for i in range(3):
+        api.post("/api/items", json={"name": f"Nut {i}", "sku": f"NUT-{i}", "category": "Fasteners", "unit_price": 1})
+    response = api.get("/api/items", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(row) for row in response.text.splitlines()]
+    assert_matches_model(server.Item, rows)
+    assert [row['sku'] for row in rows] == [item['sku'] for item in api.get("/api/items").json()]
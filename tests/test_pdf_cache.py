@@ -0,0 +1,45 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+PO = {"id": "po-1", "updated_at": datetime(2024, 5, 1, tzinfo=timezone.utc)}
+SUPPLIER = {"name": "Acme", "address": "1 Main St", "email": "a@example.com", "phone": None}
+
+
+@pytest.mark.parametrize("header,matches", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ("*", True),
+    ('"xyz"', False),
+])
+def test_etag_matches(header, matches):
+    assert server.etag_matches(header, '"abc"') is matches
+
+
+def test_pdf_cache_key_changes_with_what_is_printed():
+    key = server.pdf_cache_key(PO, SUPPLIER)
+    assert key == server.pdf_cache_key(dict(PO), dict(SUPPLIER))
+    # String and native dates from before the date migration give the same key
+    assert key == server.pdf_cache_key({**PO, "updated_at": PO['updated_at'].isoformat()}, SUPPLIER)
+    assert key != server.pdf_cache_key({**PO, "updated_at": datetime(2024, 5, 2, tzinfo=timezone.utc)}, SUPPLIER)
+    assert key != server.pdf_cache_key(PO, {**SUPPLIER, "address": "2 Main St"})
+    # Supplier fields the PDF doesn't print don't invalidate it
+    assert key == server.pdf_cache_key(PO, {**SUPPLIER, "rating": 4.5})
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    renderer = server.PDFRenderer(workers=1, cache_size=4, cache_dir=str(tmp_path), cache_dir_bytes=250)
+    for i, key in enumerate(["a", "b"]):
+        renderer._write_disk(key, b"x" * 100)
+        os.utime(tmp_path / f"{key}.pdf", (1000 + i, 1000 + i))
+    # Reading refreshes a, so b is the oldest when c pushes the tier past its limit
+    assert renderer._read_disk("a") == b"x" * 100
+    renderer._write_disk("c", b"x" * 100)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.pdf", "c.pdf"]
+    assert renderer._read_disk("b") is None
+    assert renderer._disk_bytes == 200
@@ -0,0 +1,53 @@
+import pandas as pd
+
+import server
+
+
+def frames():
+    items = pd.DataFrame([
+        {"item_id": "bolt", "name": "Bolt", "supplier_id": "s2", "quantity": 5, "reorder_level": 10, "unit_price": 0.5},
+        {"item_id": "nut", "name": "Nut", "supplier_id": "s1", "quantity": 0, "reorder_level": 5, "unit_price": 0.2},
+        {"item_id": "gear", "name": "Gear", "supplier_id": None, "quantity": 2, "reorder_level": 4, "unit_price": 9.0},
+        {"item_id": "belt", "name": "Belt", "supplier_id": "s1", "quantity": 50, "reorder_level": 10, "unit_price": 3.0},
+    ])
+    demand = pd.DataFrame([{"item_id": "bolt", "received_recent": 30}])
+    ordered = pd.DataFrame([
+        {"po_id": "po1", "item_id": "bolt", "ordered_qty": 10},
+        {"po_id": "po2", "item_id": "gear", "ordered_qty": 5},
+    ])
+    received = pd.DataFrame([
+        {"po_id": "po1", "item_id": "bolt", "received_qty": 8},
+        # Over-received lines don't count as negative stock on order
+        {"po_id": "po2", "item_id": "gear", "received_qty": 9},
+    ])
+    requested = pd.DataFrame([{"item_id": "bolt", "requested": 1}])
+    return items, demand, ordered, received, requested
+
+
+def test_orders_up_to_level_plus_cover_for_items_at_or_below_level():
+    lines = server.reorder_quantities(*frames(), lookback_days=30, cover_days=14)
+    result = lines.set_index("item_id")
+    # Bolt: position 5 + 2 on order + 1 requested = 8; cover = max(ceil(1/day * 14), 10) = 14
+    assert result.loc["bolt", "on_order"] == 2
+    assert result.loc["bolt", "daily_demand"] == 1
+    assert result.loc["bolt", "order_qty"] == 10 + 14 - 8
+    # Nut has no history, so cover is another reorder_level
+    assert result.loc["nut", "order_qty"] == 10
+    assert result.loc["gear", "on_order"] == 0
+    assert result.loc["gear", "order_qty"] == 4 + 4 - 2
+    assert "belt" not in result.index
+
+
+def test_lines_are_grouped_by_supplier_with_unassigned_last():
+    lines = server.reorder_quantities(*frames(), lookback_days=30, cover_days=14)
+    assert lines["item_id"].tolist() == ["nut", "bolt", "gear"]
+
+
+def test_nothing_to_order_without_open_documents():
+    items, demand, _, _, _ = frames()
+    empty_ordered = pd.DataFrame(columns=[*server.MATCH_LINE_KEYS, "ordered_qty"])
+    empty_received = pd.DataFrame(columns=[*server.MATCH_LINE_KEYS, "received_qty"])
+    empty_requested = pd.DataFrame(columns=["item_id", "requested"])
+    items["quantity"] = 100
+    lines = server.reorder_quantities(items, demand, empty_ordered, empty_received, empty_requested, 30, 14)
+    assert lines.empty
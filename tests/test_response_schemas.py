@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from tests.helpers import assert_matches_model, line
+
+LIST_ROUTES = [
+    ("/api/suppliers", server.Supplier),
+    ("/api/items", server.Item),
+    ("/api/purchase-requisitions", server.PurchaseRequisition),
+    ("/api/purchase-orders", server.PurchaseOrder),
+    ("/api/goods-receipts", server.GoodsReceipt),
+    ("/api/invoices", server.Invoice),
+]
+
+
+@pytest.fixture
+def documents(api, supplier, items, purchase_order):
+    api.post("/api/purchase-requisitions", json={
+        "requester_id": "u1", "requester_name": "Requester", "department": "Ops", "items": [line(items[2], 5)],
+    })
+    api.post("/api/goods-receipts", json={"po_id": purchase_order['id'], "items": [line(items[0], 10)], "received_by": "u2"})
+    api.post("/api/invoices", json={"po_id": purchase_order['id'], "supplier_id": supplier['id'], "items": [line(items[0], 10)]})
+
+
+@pytest.mark.parametrize("path,model", LIST_ROUTES)
+def test_fast_path_pages_match_the_response_model(api, documents, monkeypatch, path, model):
+    monkeypatch.setattr(server, "FAST_LIST_RESPONSES", True)
+    response = api.get(path)
+    assert response.status_code == 200
+    assert response.json()
+    assert_matches_model(model, response.json())
+
+
+def test_schema_check_rejects_drifted_documents(api, items, monkeypatch):
+    monkeypatch.setattr(server, "FAST_LIST_RESPONSES", True)
+    monkeypatch.setattr(server, "RESPONSE_SCHEMA_CHECK", True)
+    assert api.get("/api/items").status_code == 200
+    api.portal.call(server.db.items.insert_one, {"id": "drifted", "name": "No SKU", "created_at": datetime.now(timezone.utc)})
+    assert api.get("/api/items").status_code == 500
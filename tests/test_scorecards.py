@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import server
+
+CREATED = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def po(**fields):
+    return {
+        "created_at": CREATED,
+        "delivery_date": CREATED + timedelta(days=10),
+        "items": [
+            {"item_id": "bolt", "quantity": 10, "total": 5.0},
+            {"item_id": "nut", "quantity": 20, "total": 4.0},
+            {"item_id": "bolt", "quantity": 10, "total": 6.0},
+        ],
+        **fields,
+    }
+
+
+def receipt(received_date, *lines):
+    return {"received_date": received_date, "items": [{"item_id": i, "quantity": q} for i, q in lines]}
+
+
+def test_first_receipt_counts_the_ordered_quantity_once():
+    gr = receipt(CREATED + timedelta(days=4), ("bolt", 20), ("washer", 7))
+    first = server.receipt_scorecard(gr, po(), first_receipt=True)
+    assert first == {
+        "receipts": 1,
+        "lead_time_days_total": 4,
+        "dated_receipts": 1,
+        "on_time_receipts": 1,
+        "ordered_qty": 40,
+        # Lines not on the PO aren't counted as received
+        "received_qty": 20,
+    }
+    assert server.receipt_scorecard(gr, po(), first_receipt=False)["ordered_qty"] == 0
+
+
+def test_on_time_allows_the_grace_period():
+    due = CREATED + timedelta(days=10)
+    within = receipt(due + server.ON_TIME_GRACE - timedelta(minutes=1), ("bolt", 1))
+    late = receipt(due + server.ON_TIME_GRACE, ("bolt", 1))
+    assert server.receipt_scorecard(within, po(), True)["on_time_receipts"] == 1
+    assert server.receipt_scorecard(late, po(), True)["on_time_receipts"] == 0
+
+
+def test_undated_po_and_iso_string_dates():
+    gr = receipt((CREATED + timedelta(hours=12)).replace(tzinfo=None).isoformat(), ("nut", 5))
+    deltas = server.receipt_scorecard(gr, po(delivery_date=None), True)
+    assert deltas["lead_time_days_total"] == 0.5
+    assert deltas["dated_receipts"] == 0
+    assert deltas["on_time_receipts"] == 0
+
+
+def test_invoice_is_priced_at_the_po_average_for_ordered_lines_only():
+    invoice = {"items": [
+        {"item_id": "bolt", "quantity": 4, "total": 2.4},
+        {"item_id": "nut", "quantity": 10, "total": 2.0},
+        {"item_id": "freight", "quantity": 1, "total": 15.0},
+    ]}
+    deltas = server.invoice_scorecard(invoice, po())
+    assert deltas["invoiced_amount"] == 4.4
+    # Bolt averages 11.0 / 20 = 0.55, nut 4.0 / 20 = 0.2
+    assert deltas["invoiced_at_po_price"] == 4 * 0.55 + 10 * 0.2
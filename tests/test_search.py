@@ -0,0 +1,51 @@
+import server
+
+ITEMS = server.SearchKind.ITEMS
+SUPPLIERS = server.SearchKind.SUPPLIERS
+
+
+def item(doc_id, name, sku, category="Hardware"):
+    return {"id": doc_id, "name": name, "sku": sku, "category": category}
+
+
+def test_search_keys_hold_values_and_words():
+    assert server.search_keys(ITEMS, item("1", "Hex  Bolt", "HB-10")) == ["10", "bolt", "hardware", "hb", "hb-10", "hex", "hex bolt"]
+
+
+def test_search_rank_order():
+    hits = [
+        {"id": "4", "name": "Carriage Bolt", "code": "CB-1"},
+        {"id": "3", "name": "Bolt Cutter", "code": "TOOL-9"},
+        {"id": "2", "name": "Anchor", "code": "BOLT-2"},
+        {"id": "1", "name": "Hex", "code": "BOLT"},
+    ]
+    assert [h['id'] for h in sorted(hits, key=lambda h: server.search_rank(h, "bolt"))] == ["1", "2", "3", "4"]
+
+
+def test_prefix_index_finds_ranks_and_limits():
+    index = server.PrefixIndex()
+    index.put(ITEMS, item("1", "Hex Bolt", "HB-10"))
+    index.put(ITEMS, item("2", "Bolt Cutter", "BC-1", "Tools"))
+    index.put(ITEMS, item("3", "Washer", "W-1"))
+    index.put(SUPPLIERS, {"id": "s1", "name": "Bolt Depot", "tax_id": "BD-1"})
+
+    assert [h['id'] for h in index.search("bolt", [ITEMS], 10)] == ["2", "1"]
+    assert [h['id'] for h in index.search("bolt", list(server.SearchKind), 10)] == ["2", "s1", "1"]
+    assert [h['id'] for h in index.search("bolt", [ITEMS], 1)] == ["2"]
+    assert index.search("nut", [ITEMS], 10) == []
+
+
+def test_prefix_index_put_replaces_old_keys():
+    index = server.PrefixIndex()
+    index.put(ITEMS, item("1", "Hex Bolt", "HB-10"))
+    index.put(ITEMS, item("1", "Hex Nut", "HN-10"))
+    assert index.search("bolt", [ITEMS], 10) == []
+    assert [h['name'] for h in index.search("nut", [ITEMS], 10)] == ["Hex Nut"]
+    assert len(index.entries[ITEMS]) == 1
+
+
+def test_writes_during_a_load_are_replayed():
+    index = server.PrefixIndex()
+    index.pending[ITEMS] = []
+    index.put(ITEMS, item("1", "Hex Bolt", "HB-10"))
+    assert index.pending[ITEMS] == [item("1", "Hex Bolt", "HB-10")]
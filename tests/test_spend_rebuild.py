@@ -0,0 +1,31 @@
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+async def hold_and_try(name):
+    async with server.mongo_lock(name, "busy"):
+        with pytest.raises(HTTPException) as exc:
+            async with server.mongo_lock(name, "busy"):
+                pass
+        return exc.value.status_code
+
+
+def test_a_held_lock_turns_away_a_second_run(api):
+    assert api.portal.call(hold_and_try, "spend_rebuild") == 409
+    # Released on exit
+    assert api.portal.call(server.db.locks.find_one, {"_id": "spend_rebuild"}) is None
+
+
+def test_an_expired_lock_is_taken_over(api):
+    expired = server.datetime.now(server.timezone.utc) - server.LOCK_TTL
+    api.portal.call(server.db.locks.insert_one, {"_id": "spend_rebuild", "owner": "crashed", "expires_at": expired})
+    assert api.post("/api/analytics/spend/rebuild").status_code == 200
+
+
+def test_rebuild_is_refused_while_another_runs(api):
+    future = server.datetime.now(server.timezone.utc) + server.LOCK_TTL
+    api.portal.call(server.db.locks.insert_one, {"_id": "spend_rebuild", "owner": "other", "expires_at": future})
+    response = api.post("/api/analytics/spend/rebuild")
+    assert (response.status_code, response.json()['detail']) == (409, "A spend rollup rebuild is already running")
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+import server
+
+
+def frame(rows, measures):
+    return pd.DataFrame(rows, columns=[*server.MATCH_LINE_KEYS, *measures])
+
+
+@pytest.fixture
+def matched():
+    po = frame([
+        ("po1", "clean", 10, 100.0),
+        ("po1", "over_received", 10, 100.0),
+        ("po1", "over_invoiced", 10, 100.0),
+        ("po1", "pricey", 10, 100.0),
+        ("po1", "untouched", 5, 50.0),
+    ], ["ordered_qty", "ordered_amount"])
+    gr = frame([
+        ("po1", "clean", 10),
+        ("po1", "over_received", 12),
+        ("po1", "over_invoiced", 4),
+        ("po1", "pricey", 10),
+        ("po1", "stray", 1),
+    ], ["received_qty"])
+    inv = frame([
+        ("po1", "clean", 10, 100.0),
+        ("po1", "over_invoiced", 6, 60.0),
+        ("po1", "pricey", 10, 110.0),
+    ], ["invoiced_qty", "invoiced_amount"])
+    return server.match_lines(po, gr, inv, qty_tolerance=0, price_tolerance=0.01)
+
+
+def flagged(exceptions):
+    types = [t.value for t in server.MatchExceptionType]
+    return {row.item_id: sorted(t for t in types if getattr(row, t)) for row in exceptions.itertuples()}
+
+
+def test_match_lines_flags_each_exception(matched):
+    lines, exceptions = matched
+    # Lines with nothing received or billed are skipped
+    assert sorted(lines["item_id"]) == ["clean", "over_invoiced", "over_received", "pricey", "stray"]
+    assert flagged(exceptions) == {
+        "over_received": ["over_received"],
+        "over_invoiced": ["over_invoiced"],
+        "pricey": ["price_variance"],
+        "stray": ["not_on_po"],
+    }
+    pricey = exceptions.set_index("item_id").loc["pricey"]
+    assert (pricey["po_unit_price"], pricey["invoiced_unit_price"]) == (10.0, 11.0)
+    assert pricey["price_variance_pct"] == pytest.approx(0.1)
+
+
+def test_tolerances_widen_the_match():
+    po = frame([("po1", "a", 10, 100.0)], ["ordered_qty", "ordered_amount"])
+    gr = frame([("po1", "a", 11)], ["received_qty"])
+    inv = frame([("po1", "a", 11, 113.3)], ["invoiced_qty", "invoiced_amount"])
+    _, exceptions = server.match_lines(po, gr, inv, qty_tolerance=0.1, price_tolerance=0.05)
+    assert exceptions.empty
+
+
+def test_exception_documents_are_valid_models(matched):
+    _, exceptions = matched
+    detected_at = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    docs = server.exception_documents(exceptions, "run-1", detected_at)
+    assert len(docs) == 4
+    models = [server.MatchException(**doc) for doc in docs]
+    stray = next(m for m in models if m.item_id == "stray")
+    assert stray.types == [server.MatchExceptionType.NOT_ON_PO]
+    # NaN prices become None rather than leaking into Mongo
+    assert (stray.po_unit_price, stray.invoiced_unit_price, stray.price_variance_pct) == (None, None, None)
+    assert {m.run_id for m in models} == {"run-1"} and {m.detected_at for m in models} == {detected_at}
+
+
+def test_no_lines():
+    empty = server.match_lines(
+        frame([], ["ordered_qty", "ordered_amount"]), frame([], ["received_qty"]),
+        frame([], ["invoiced_qty", "invoiced_amount"]), 0, 0.01,
+    )
+    assert empty[0].empty and empty[1].empty
+    assert server.exception_documents(empty[1], "run", datetime.now(timezone.utc)) == []
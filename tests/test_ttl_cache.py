@@ -0,0 +1,41 @@
+import pytest
+
+import server
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = server.TTLCache(ttl=30)
+    cache.set("stats", {"total_pos": 3})
+    clock[0] += 29
+    assert cache.get("stats") == {"total_pos": 3}
+    clock[0] += 2
+    assert cache.get("stats") is None
+    assert cache.get("stats", "fallback") == "fallback"
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = server.TTLCache(ttl=30, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_invalidate_one_or_all(clock):
+    cache = server.TTLCache(ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert (cache.get("a"), cache.get("b")) == (None, 2)
+    cache.invalidate()
+    assert len(cache) == 0